@@ -0,0 +1,279 @@
+"""
+Vectorized historical backtest of the runner.py strategy.
+
+Replays candles from a CSV or Parquet file through the same logic as the live
+runner (compute_return -> rolling mean -> signal_from_return -> handle_signal
+-> record_equity), but computed over whole NumPy arrays instead of one candle
+at a time. It produces the same positions, PnL and equity curve as the live
+path; --validate re-runs the event-driven logic and checks that.
+
+Input: one row per candle with a numeric timestamp column and a close column
+(defaults: "timestamp" and "close"). Repeated timestamps are dropped, as the
+live runner ignores repeated candle_start_time values.
+
+Usage:
+    python backtest.py candles.csv
+    python backtest.py candles.parquet --window 10 --long-thresh 0.01 --short-thresh -0.01
+    python backtest.py candles.csv --validate --equity-out equity.jsonl
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import warnings
+from collections import deque
+
+import numpy as np
+
+# =========================
+# DEFAULTS (MATCH runner.py)
+# =========================
+WINDOW = 5
+LONG_THRESH = 0.005
+SHORT_THRESH = -0.005
+
+POSITION_SIZE = 1
+START_BALANCE = 100_000
+
+MINUTES_PER_YEAR = 365 * 24 * 60    # candlestick_1m periods, for annualized Sharpe
+POSITION_NAMES = {0: "FLAT", 1: "LONG", -1: "SHORT"}
+
+
+# =========================
+# INPUT
+# =========================
+def load_candles(path, ts_col="timestamp", close_col="close"):
+    """Returns (timestamps int64, closes float64) with repeated timestamps dropped."""
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            print("ERROR: Parquet input requires 'pyarrow'. Install it with: pip install pyarrow")
+            sys.exit(1)
+        table = pq.read_table(path, columns=[ts_col, close_col])
+        ts = table.column(ts_col).to_numpy().astype(np.int64)
+        close = table.column(close_col).to_numpy().astype(np.float64)
+    else:
+        with open(path, newline="") as f:
+            header = next(csv.reader(f))
+        try:
+            ts_idx, close_idx = header.index(ts_col), header.index(close_col)
+        except ValueError:
+            print(f"ERROR: {path} needs '{ts_col}' and '{close_col}' columns (found: {', '.join(header)}).")
+            sys.exit(1)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)  # a header-only file is just zero candles
+            ts = np.loadtxt(path, delimiter=",", skiprows=1, usecols=ts_idx, dtype=np.int64, ndmin=1)
+            close = np.loadtxt(path, delimiter=",", skiprows=1, usecols=close_idx, dtype=np.float64, ndmin=1)
+
+    keep = np.ones(len(ts), dtype=bool)
+    keep[1:] = ts[1:] != ts[:-1]
+    return ts[keep], close[keep]
+
+
+# =========================
+# VECTORIZED SIMULATION
+# =========================
+def simulate(close, window=WINDOW, long_thresh=LONG_THRESH, short_thresh=SHORT_THRESH,
+             position_size=POSITION_SIZE, start_balance=START_BALANCE):
+    """Runs the strategy over a whole close array.
+
+    Returns {ret_pct, position, balance} arrays, one entry per candle, equal to
+    what the live runner holds after handle_signal() for that candle.
+    """
+    n = len(close)
+    if n == 0:
+        return {"ret_pct": np.zeros(0), "position": np.zeros(0, dtype=np.int8),
+                "balance": np.zeros(0), "trades": 0}
+    prev = close[:-1]
+
+    # compute_return: 0.0 when the previous close is 0; the first candle has no return
+    returns = np.zeros(n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns[1:] = np.where(prev != 0, (close[1:] - prev) / prev, 0.0)
+
+    # rolling mean of the last min(i, window) returns, via prefix sums
+    csum = np.cumsum(returns)
+    idx = np.arange(n)
+    start = np.maximum(idx - window, 0)
+    count = np.minimum(idx, window)
+    ret_pct = np.zeros(n)
+    has = count > 0
+    ret_pct[has] = (csum[has] - csum[start[has]]) / count[has] * 100
+
+    # signal_from_return; handle_signal always ends in the position named by the signal
+    position = np.zeros(n, dtype=np.int8)
+    position[ret_pct > long_thresh] = 1
+    position[ret_pct < short_thresh] = -1
+
+    prev_pos = np.empty_like(position)
+    prev_pos[0] = 0
+    prev_pos[1:] = position[:-1]
+    entries = (position != prev_pos) & (position != 0)
+    exits = (prev_pos != 0) & (position != prev_pos)
+
+    # entry price of the position held coming into each candle
+    last_entry = np.maximum.accumulate(np.where(entries, idx, 0))
+    held_entry = np.empty_like(last_entry)
+    held_entry[0] = 0
+    held_entry[1:] = last_entry[:-1]
+
+    pnl = np.where(exits, (close - close[held_entry]) * position_size * prev_pos, 0.0)
+    # sequential accumulation from the starting balance, as the live += does
+    balance = np.cumsum(np.concatenate(([float(start_balance)], pnl)))[1:]
+
+    return {"ret_pct": ret_pct, "position": position, "balance": balance, "trades": int(entries.sum())}
+
+
+def summarize(result):
+    balance = result["balance"]
+    if not len(balance):
+        return None
+    drawdown = np.maximum.accumulate(balance) - balance
+    returns = np.diff(balance) / balance[:-1]
+    std = returns.std() if returns.size > 1 else 0.0
+    return {
+        "candles": len(balance),
+        "final_balance": float(balance[-1]),
+        "max_drawdown": float(drawdown.max()),
+        "sharpe": float(returns.mean() / std * np.sqrt(MINUTES_PER_YEAR)) if std > 0 else 0.0,
+        "trades": result["trades"],
+    }
+
+
+# =========================
+# EVENT-DRIVEN REFERENCE (VALIDATION)
+# =========================
+def run_event_driven(close, window=WINDOW, long_thresh=LONG_THRESH, short_thresh=SHORT_THRESH,
+                     position_size=POSITION_SIZE, start_balance=START_BALANCE):
+    """One candle at a time, structured exactly like runner.py's consume_ws loop."""
+    closes = deque(maxlen=window + 1)
+    returns = deque(maxlen=window)
+    position = "FLAT"
+    entry_price = None
+    balance = start_balance
+    trades = 0
+    out_ret, out_pos, out_bal = [], [], []
+
+    for price in close.tolist():
+        if closes:
+            prev = closes[-1]
+            returns.append((price - prev) / prev if prev else 0.0)
+        closes.append(price)
+
+        ret_pct = (sum(returns) / len(returns) if returns else 0.0) * 100
+        signal = 1 if ret_pct > long_thresh else -1 if ret_pct < short_thresh else 0
+
+        # handle_signal
+        if position == "FLAT":
+            if signal != 0:
+                position, entry_price, trades = ("LONG" if signal == 1 else "SHORT"), price, trades + 1
+        elif position == "LONG":
+            if signal <= 0:
+                balance += (price - entry_price) * position_size
+                position, entry_price = "FLAT", None
+                if signal == -1:
+                    position, entry_price, trades = "SHORT", price, trades + 1
+        elif position == "SHORT":
+            if signal >= 0:
+                balance += (entry_price - price) * position_size
+                position, entry_price = "FLAT", None
+                if signal == 1:
+                    position, entry_price, trades = "LONG", price, trades + 1
+
+        out_ret.append(ret_pct)
+        out_pos.append({"FLAT": 0, "LONG": 1, "SHORT": -1}[position])
+        out_bal.append(balance)
+
+    return {"ret_pct": np.array(out_ret), "position": np.array(out_pos, dtype=np.int8),
+            "balance": np.array(out_bal, dtype=np.float64), "trades": trades}
+
+
+def validate(close, params, result):
+    reference = run_event_driven(close, **params)
+    mismatched = int(np.count_nonzero(reference["position"] != result["position"]))
+    balance_diff = float(np.abs(reference["balance"] - result["balance"]).max()) if len(close) else 0.0
+    ret_diff = float(np.abs(reference["ret_pct"] - result["ret_pct"]).max()) if len(close) else 0.0
+    ok = mismatched == 0 and reference["trades"] == result["trades"] and balance_diff <= 1e-6
+    print(f"Validation   : {'OK' if ok else 'MISMATCH'} vs event-driven loop "
+          f"(position mismatches={mismatched}, trades {result['trades']}/{reference['trades']}, "
+          f"max balance diff={balance_diff:.3g}, max ret% diff={ret_diff:.3g})")
+    return ok
+
+
+# =========================
+# OUTPUT
+# =========================
+def write_equity(path, ts, close, result):
+    """Same JSON Lines format as the live runner's equity.jsonl."""
+    with open(path, "w") as f:
+        for t, price, bal, pos in zip(ts.tolist(), close.tolist(), result["balance"].tolist(), result["position"].tolist()):
+            f.write(json.dumps({"timestamp": t, "balance": bal, "position": POSITION_NAMES[pos], "price": price},
+                               separators=(",", ":")) + "\n")
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Vectorized backtest of the runner strategy.")
+    p.add_argument("path", help="Candles as .csv or .parquet")
+    p.add_argument("--ts-col", default="timestamp")
+    p.add_argument("--close-col", default="close")
+    p.add_argument("--window", type=int, default=WINDOW)
+    p.add_argument("--long-thresh", type=float, default=LONG_THRESH)
+    p.add_argument("--short-thresh", type=float, default=SHORT_THRESH)
+    p.add_argument("--position-size", type=float, default=POSITION_SIZE)
+    p.add_argument("--start-balance", type=float, default=START_BALANCE)
+    p.add_argument("--validate", action="store_true", help="Check results against the event-driven loop")
+    p.add_argument("--equity-out", metavar="PATH", help="Write the equity curve as JSON Lines")
+    args = p.parse_args()
+    if args.window < 1:
+        p.error("--window must be at least 1")
+    return args
+
+
+def main():
+    args = parse_args()
+    if not os.path.exists(args.path):
+        print(f"ERROR: {args.path} not found.")
+        sys.exit(1)
+
+    ts, close = load_candles(args.path, args.ts_col, args.close_col)
+    params = {
+        "window": args.window,
+        "long_thresh": args.long_thresh,
+        "short_thresh": args.short_thresh,
+        "position_size": args.position_size,
+        "start_balance": args.start_balance,
+    }
+
+    started = time.perf_counter()
+    result = simulate(close, **params)
+    elapsed = time.perf_counter() - started
+    stats = summarize(result)
+
+    print("=" * 70)
+    print(f"BACKTEST — {args.path}")
+    print("=" * 70)
+    print("Params       : " + " ".join(f"{k}={v}" for k, v in params.items()))
+    if stats is None:
+        print("No candles to simulate.")
+        return
+    print(f"Candles      : {stats['candles']}")
+    print(f"Final balance: {stats['final_balance']:.2f} (PnL {stats['final_balance'] - args.start_balance:+.2f})")
+    print(f"Trades       : {stats['trades']}")
+    print(f"Max drawdown : {stats['max_drawdown']:.2f}")
+    print(f"Sharpe (ann.): {stats['sharpe']:.2f}")
+    print(f"Speed        : {stats['candles'] / elapsed if elapsed > 0 else float('inf'):,.0f} candles/s")
+
+    if args.equity_out:
+        write_equity(args.equity_out, ts, close, result)
+        print(f"Equity curve : {args.equity_out}")
+
+    if args.validate and not validate(close, params, result):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
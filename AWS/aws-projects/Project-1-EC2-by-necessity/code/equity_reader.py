@@ -0,0 +1,161 @@
+"""
+Reader for the append-only equity stream written by the runner (equity.jsonl).
+
+The runner appends one JSON object per candle:
+    {"timestamp": ..., "balance": ..., "position": ..., "price": ...}
+
+Usage:
+    python equity_reader.py equity.jsonl                 # summary of the full curve
+    python equity_reader.py equity.jsonl --tail 20       # last 20 points
+    python equity_reader.py equity.jsonl --tail 5 --follow
+    python equity_reader.py equity.jsonl --rebuild equity.json
+
+A partially written last line (e.g. the process was killed mid-append) is
+ignored rather than treated as an error.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+FOLLOW_POLL_SECONDS = 1.0
+TAIL_BLOCK_BYTES = 64 * 1024
+
+
+# =========================
+# READERS
+# =========================
+def read_equity(path):
+    """Yields every complete point in file order (rebuilds the full curve lazily)."""
+    with open(path, "rb") as f:
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                return  # torn final append
+            yield json.loads(raw)
+
+
+def tail_equity(path, n):
+    """Returns the last n complete points, reading backwards from the end of the file."""
+    if n <= 0:
+        return []
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b""
+        # one extra newline covers a torn final line
+        while pos > 0 and data.count(b"\n") <= n:
+            step = min(TAIL_BLOCK_BYTES, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+
+    lines = data.split(b"\n")
+    lines.pop()  # text after the last newline: empty, or a torn append
+    if pos > 0:
+        lines = lines[1:]  # first line may be cut by the block boundary
+    return [json.loads(line) for line in lines[-n:] if line]
+
+
+def complete_size(path):
+    """Byte offset just past the last newline, i.e. where a torn append starts."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        while pos > 0:
+            step = min(TAIL_BLOCK_BYTES, pos)
+            pos -= step
+            f.seek(pos)
+            idx = f.read(step).rfind(b"\n")
+            if idx >= 0:
+                return pos + idx + 1
+    return 0
+
+
+def follow_equity(path, offset):
+    """Yields points appended after byte offset, polling until interrupted."""
+    buffer = b""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while True:
+            chunk = f.read()
+            if not chunk:
+                time.sleep(FOLLOW_POLL_SECONDS)
+                continue
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line:
+                    yield json.loads(line)
+
+
+# =========================
+# OUTPUT
+# =========================
+def format_point(p):
+    return f"{p['timestamp']}  {p['position']:<5}  price={p['price']}  balance={p['balance']:.2f}"
+
+
+def print_summary(path):
+    count = 0
+    first = last = None
+    peak = None
+    max_drawdown = 0.0
+    for p in read_equity(path):
+        if first is None:
+            first = p
+        last = p
+        count += 1
+        peak = p["balance"] if peak is None else max(peak, p["balance"])
+        max_drawdown = max(max_drawdown, peak - p["balance"])
+
+    if not count:
+        print("No equity points recorded.")
+        return
+    print(f"Points        : {count}")
+    print(f"From / to     : {first['timestamp']} → {last['timestamp']}")
+    print(f"Balance       : {first['balance']:.2f} → {last['balance']:.2f} "
+          f"(PnL {last['balance'] - first['balance']:+.2f})")
+    print(f"Max drawdown  : {max_drawdown:.2f}")
+    print(f"Last position : {last['position']}")
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Read the runner's append-only equity stream.")
+    p.add_argument("path", help="equity.jsonl written by the runner")
+    p.add_argument("--tail", type=int, metavar="N", help="Print the last N points")
+    p.add_argument("--follow", action="store_true", help="With --tail, keep printing new points as they are appended")
+    p.add_argument("--rebuild", metavar="OUT", help="Write the full curve as a JSON list (the old equity.json format)")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not os.path.exists(args.path):
+        print(f"ERROR: {args.path} not found.")
+        sys.exit(1)
+
+    if args.rebuild:
+        with open(args.rebuild, "w") as f:
+            json.dump(list(read_equity(args.path)), f, indent=2)
+        print(f"Rebuilt {args.rebuild}")
+        return
+
+    if args.tail is None:
+        print_summary(args.path)
+        return
+
+    offset = complete_size(args.path)
+    for p in tail_equity(args.path, args.tail):
+        print(format_point(p))
+    if args.follow:
+        try:
+            for p in follow_equity(args.path, offset):
+                print(format_point(p), flush=True)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Parallel parameter sweep over the vectorized backtest (backtest.py).
+
+Every combination of WINDOW, LONG_THRESH, SHORT_THRESH and POSITION_SIZE is
+backtested against every candle file given. Candle close arrays are loaded
+once and placed in shared memory; worker processes map them directly, so
+only the parameters are sent per task.
+
+Results stream to <out>/results.jsonl as each combination finishes.
+<out>/leaderboard.csv is re-ranked periodically and at the end. Re-running
+the same command resumes: combinations already in results.jsonl are skipped,
+unless the candle file has changed (size or mtime) since they were run.
+
+Usage:
+    python sweep.py BTCUSD=btc.parquet ETHUSD=eth.csv \\
+        --windows 3,5,10,20 --long-threshs 0.003,0.005,0.01 \\
+        --short-threshs=-0.003,-0.005,-0.01 --position-sizes 1 --out sweep_out
+
+(Negative lists need the --opt=value form so argparse does not read them as flags.)
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from backtest import START_BALANCE, load_candles, simulate, summarize
+
+RESULTS_FILE = "results.jsonl"
+LEADERBOARD_FILE = "leaderboard.csv"
+LEADERBOARD_EVERY = 500          # re-rank after this many new results
+RANK_METRICS = ("sharpe", "final_balance", "max_drawdown")
+LEADERBOARD_FIELDS = ("rank", "dataset", "window", "long_thresh", "short_thresh", "position_size",
+                      "final_balance", "pnl", "trades", "max_drawdown", "sharpe")
+
+
+# =========================
+# SHARED CANDLE ARRAYS
+# =========================
+_datasets = {}  # per worker: label -> (SharedMemory, close array view)
+
+
+def share_closes(datasets):
+    """Copies each close array into a named shared-memory block; returns (blocks, specs).
+    Arrays must be non-empty: a zero-size block cannot be created."""
+    blocks, specs = [], {}
+    for label, close in datasets.items():
+        shm = shared_memory.SharedMemory(create=True, size=close.nbytes)
+        np.ndarray(close.shape, dtype=np.float64, buffer=shm.buf)[:] = close
+        blocks.append(shm)
+        specs[label] = (shm.name, len(close))
+    return blocks, specs
+
+
+def _attach(specs):
+    """Worker initializer: maps every shared block read-only, without copying."""
+    for label, (name, n) in specs.items():
+        # workers share the parent's resource tracker, so attaching does not
+        # change ownership: only the parent unlinks the block
+        shm = shared_memory.SharedMemory(name=name)
+        close = np.ndarray((n,), dtype=np.float64, buffer=shm.buf)
+        close.flags.writeable = False
+        _datasets[label] = (shm, close)
+
+
+def _run_combo(task):
+    label, window, long_thresh, short_thresh, position_size = task
+    _, close = _datasets[label]
+    stats = summarize(simulate(close, window, long_thresh, short_thresh, position_size, START_BALANCE))
+    return task, stats
+
+
+# =========================
+# RESUME + LEADERBOARD
+# =========================
+def dataset_id(path):
+    """Identifies a candle file's contents for resume: absolute path, size and mtime."""
+    st = os.stat(path)
+    return [os.path.abspath(path), st.st_size, st.st_mtime_ns]
+
+
+def task_key(task, source):
+    return json.dumps([source, *task])
+
+
+def load_results(path):
+    """Completed results from a previous (possibly interrupted) run.
+
+    A torn final line is cut off so that new results append cleanly after it.
+    """
+    results = {}
+    valid = 0
+    try:
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                row = json.loads(line)
+                results[task_key(row["task"], row.get("source"))] = row
+                valid += len(line)
+    except FileNotFoundError:
+        return results
+    if valid < os.path.getsize(path):
+        os.truncate(path, valid)
+    return results
+
+
+def write_leaderboard(path, results, rank_by):
+    rows = [r for r in results.values() if r["stats"] is not None]
+    # drawdown ranks ascending (smaller is better); everything else descending
+    rows.sort(key=lambda r: r["stats"][rank_by], reverse=(rank_by != "max_drawdown"))
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(LEADERBOARD_FIELDS)
+        for rank, r in enumerate(rows, 1):
+            label, window, long_thresh, short_thresh, position_size = r["task"]
+            s = r["stats"]
+            writer.writerow([rank, label, window, long_thresh, short_thresh, position_size,
+                             f"{s['final_balance']:.2f}", f"{s['final_balance'] - START_BALANCE:.2f}",
+                             s["trades"], f"{s['max_drawdown']:.2f}", f"{s['sharpe']:.4f}"])
+    os.replace(tmp, path)  # readers never see a half-written leaderboard
+    return rows
+
+
+# =========================
+# MAIN
+# =========================
+def _floats(text):
+    return [float(v) for v in text.split(",") if v.strip()]
+
+
+def _ints(text):
+    return [int(v) for v in text.split(",") if v.strip()]
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Process-pool parameter sweep of the runner strategy.")
+    p.add_argument("data", nargs="+", metavar="[LABEL=]PATH",
+                   help="Candle files (.csv/.parquet); label defaults to the file name")
+    p.add_argument("--windows", type=_ints, default=[5])
+    p.add_argument("--long-threshs", type=_floats, default=[0.005])
+    p.add_argument("--short-threshs", type=_floats, default=[-0.005])
+    p.add_argument("--position-sizes", type=_floats, default=[1.0])
+    p.add_argument("--ts-col", default="timestamp")
+    p.add_argument("--close-col", default="close")
+    p.add_argument("--rank-by", choices=RANK_METRICS, default="sharpe")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--top", type=int, default=10, help="Rows of the final leaderboard to print")
+    p.add_argument("--out", default="sweep_out", help="Directory for results.jsonl and leaderboard.csv")
+    args = p.parse_args()
+    if any(w < 1 for w in args.windows):
+        p.error("--windows must all be at least 1")
+    return args
+
+
+def main():
+    args = parse_args()
+    os.makedirs(args.out, exist_ok=True)
+    results_path = os.path.join(args.out, RESULTS_FILE)
+    leaderboard_path = os.path.join(args.out, LEADERBOARD_FILE)
+
+    datasets, sources = {}, {}
+    for item in args.data:
+        label, _, path = item.rpartition("=")
+        label = label or os.path.splitext(os.path.basename(path))[0]
+        if not os.path.exists(path):
+            print(f"ERROR: {path} not found.")
+            sys.exit(1)
+        datasets[label] = load_candles(path, args.ts_col, args.close_col)[1]
+        sources[label] = dataset_id(path)
+        print(f"Loaded {label}: {len(datasets[label])} candles")
+        if not len(datasets[label]):
+            print(f"NOTE: {label} has no candles; its combinations are recorded without stats.")
+
+    grid = list(itertools.product(sorted(datasets), args.windows, args.long_threshs,
+                                  args.short_threshs, args.position_sizes))
+    results = load_results(results_path)
+    # rows for a file that has changed since are stale: rerun them and keep them off the leaderboard
+    stale = [k for k, r in results.items() if r["task"][0] in sources and r.get("source") != sources[r["task"][0]]]
+    for key in stale:
+        del results[key]
+    pending = [t for t in grid if task_key(t, sources[t[0]]) not in results]
+    print(f"Combinations : {len(grid)} ({len(grid) - len(pending)} already done, {len(pending)} to run)")
+    if stale:
+        print(f"NOTE: {len(stale)} earlier results are for candle files that have changed; ignoring them.")
+    print(f"Workers      : {args.workers}")
+
+    started = time.perf_counter()
+    if pending:
+        with open(results_path, "a") as out:
+            def record(task, stats):
+                row = {"task": list(task), "source": sources[task[0]], "stats": stats}
+                out.write(json.dumps(row) + "\n")
+                out.flush()
+                results[task_key(task, row["source"])] = row
+
+            runnable = [t for t in pending if len(datasets[t[0]])]
+            for task in pending:
+                if not len(datasets[task[0]]):
+                    record(task, None)  # nothing to simulate; a null row still lets resume skip it
+
+            if runnable:
+                blocks, specs = share_closes({label: close for label, close in datasets.items() if len(close)})
+                try:
+                    with ProcessPoolExecutor(max_workers=args.workers, initializer=_attach,
+                                             initargs=(specs,)) as pool:
+                        futures = [pool.submit(_run_combo, t) for t in runnable]
+                        for done, future in enumerate(as_completed(futures), 1):
+                            record(*future.result())
+                            if done % LEADERBOARD_EVERY == 0:
+                                write_leaderboard(leaderboard_path, results, args.rank_by)
+                                print(f"  {done}/{len(runnable)} done")
+                finally:
+                    for shm in blocks:
+                        shm.close()
+                        shm.unlink()
+
+    ranked = write_leaderboard(leaderboard_path, results, args.rank_by)
+    elapsed = time.perf_counter() - started
+    print(f"Finished {len(pending)} backtests in {elapsed:.1f}s. Leaderboard: {leaderboard_path}")
+
+    print(f"\nTOP {min(args.top, len(ranked))} BY {args.rank_by.upper()}")
+    print("-" * 90)
+    print(f"{'Dataset':<12} {'Window':<7} {'Long':<8} {'Short':<8} {'Size':<6} "
+          f"{'PnL':>12} {'Trades':>8} {'MaxDD':>10} {'Sharpe':>9}")
+    for r in ranked[:args.top]:
+        label, window, long_thresh, short_thresh, position_size = r["task"]
+        s = r["stats"]
+        print(f"{label:<12} {window:<7} {long_thresh:<8g} {short_thresh:<8g} {position_size:<6g} "
+              f"{s['final_balance'] - START_BALANCE:>12.2f} {s['trades']:>8} {s['max_drawdown']:>10.2f} {s['sharpe']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
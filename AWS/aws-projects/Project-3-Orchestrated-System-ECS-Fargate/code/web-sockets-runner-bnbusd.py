@@ -19,10 +19,15 @@ Lifecycle Guarantees:
 
 import asyncio
 import json
+import math
 import time
 import traceback
+from array import array
 from collections import deque
+from typing import NamedTuple
 import os
+import shutil
+import sys
 import websockets
 import boto3
 from botocore.exceptions import ClientError
@@ -67,7 +72,181 @@ START_BALANCE = 10_000
 PING_INTERVAL = 20
 
 LOG_FILE = "trades.log"
-EQUITY_FILE = "equity.json"
+EQUITY_FILE = "equity.jsonl"   # append-only, one JSON point per line (read with equity_reader.py)
+EQUITY_FLUSH_POINTS = 100      # points buffered before each append
+EQUITY_SPILL_DIR = "equity_columns"
+
+# =========================
+# EQUITY COLUMNS (BOUNDED MEMORY)
+# =========================
+EQUITY_CHUNK_POINTS = 4096          # points held in memory before a chunk spills to disk
+POSITION_CODES = {"FLAT": 0, "LONG": 1, "SHORT": -1}
+MINUTES_PER_YEAR = 365 * 24 * 60    # candlestick_1m periods, for annualized Sharpe
+
+class EquityColumns:
+    """Columnar equity curve: one array.array per field for the current chunk.
+    Full chunks are appended to raw per-column files in spill_dir and read back
+    memory-mapped at the end of the run, so RSS stays flat however long it runs."""
+
+    FIELDS = (("timestamp", "q"), ("balance", "d"), ("price", "d"), ("position", "b"))
+
+    def __init__(self, spill_dir):
+        self.spill_dir = spill_dir
+        # chunks left by a killed run would otherwise be read back as this run's
+        shutil.rmtree(spill_dir, ignore_errors=True)
+        self.spilled = 0
+        self.columns = {name: array(code) for name, code in self.FIELDS}
+
+    def __len__(self):
+        return self.spilled + len(self.columns["timestamp"])
+
+    def append(self, ts, balance, price, position):
+        c = self.columns
+        c["timestamp"].append(int(ts))
+        c["balance"].append(balance)
+        c["price"].append(price)
+        c["position"].append(POSITION_CODES[position])
+        if len(c["timestamp"]) >= EQUITY_CHUNK_POINTS:
+            self.spill()
+
+    def _path(self, name):
+        return os.path.join(self.spill_dir, f"{name}.bin")
+
+    def spill(self):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        for name, column in self.columns.items():
+            with open(self._path(name), "ab") as f:
+                column.tofile(f)
+        self.spilled += len(self.columns["timestamp"])
+        self.columns = {name: array(code) for name, code in self.FIELDS}
+
+    def column(self, name):
+        """Full column as a NumPy array: memory-mapped spilled chunks + in-memory tail."""
+        import numpy as np
+        code = dict(self.FIELDS)[name]
+        tail = np.frombuffer(self.columns[name], dtype=code)
+        if not self.spilled:
+            return tail
+        head = np.memmap(self._path(name), dtype=code, mode="r", shape=(self.spilled,))
+        return np.concatenate([head, tail])
+
+    def summary(self):
+        """Vectorized end-of-run stats; None if NumPy is unavailable or nothing was recorded."""
+        try:
+            import numpy as np
+        except ImportError:
+            return None
+        if not len(self):
+            return None
+
+        balance = self.column("balance")
+        position = self.column("position")
+        drawdown = np.maximum.accumulate(balance) - balance
+        returns = np.diff(balance) / balance[:-1]
+        std = returns.std() if returns.size > 1 else 0.0
+        sharpe = float(returns.mean() / std * np.sqrt(MINUTES_PER_YEAR)) if std > 0 else 0.0
+        entries = int(np.count_nonzero((position[1:] != position[:-1]) & (position[1:] != 0)))
+        return {
+            "points": len(self),
+            "final_balance": float(balance[-1]),
+            "max_drawdown": float(drawdown.max()),
+            "sharpe": sharpe,
+            "trades": entries + int(position[0] != 0),
+        }
+
+    def close(self):
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+def format_equity_summary(stats):
+    if stats is None:
+        return "unavailable (NumPy not installed or no points)"
+    return (f"points={stats['points']} final_balance={stats['final_balance']:.2f} "
+            f"max_drawdown={stats['max_drawdown']:.2f} sharpe={stats['sharpe']:.2f} trades={stats['trades']}")
+
+# =========================
+# ROLLING STATISTICS (O(1) PER CANDLE)
+# =========================
+EXTRA_STAT_WINDOWS = ()    # e.g. (20, 60): more windows, still O(1) each per candle
+EMA_SPANS = ()             # e.g. (10, 50)
+RESYNC_EVERY = 10_000      # re-sum a window periodically to cancel floating-point drift
+
+class RollingWindow:
+    """Ring buffer with running sum and sum of squares: mean, variance and
+    z-score in O(1) per update regardless of window size."""
+
+    __slots__ = ("size", "values", "total", "total_sq", "updates")
+
+    def __init__(self, size):
+        self.size = size
+        self.values = deque(maxlen=size)
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.updates = 0
+
+    def push(self, x):
+        if len(self.values) == self.size:
+            old = self.values[0]
+            self.total -= old
+            self.total_sq -= old * old
+        self.values.append(x)
+        self.total += x
+        self.total_sq += x * x
+        self.updates += 1
+        if self.updates % RESYNC_EVERY == 0:
+            self.total = sum(self.values)
+            self.total_sq = sum(v * v for v in self.values)
+
+    def mean(self):
+        return self.total / len(self.values) if self.values else 0.0
+
+    def variance(self):
+        n = len(self.values)
+        if n < 2:
+            return 0.0
+        m = self.total / n
+        return max(self.total_sq / n - m * m, 0.0)
+
+    def zscore(self, x):
+        var = self.variance()
+        return (x - self.mean()) / math.sqrt(var) if var > 0 else 0.0
+
+class Ema:
+    __slots__ = ("alpha", "value")
+
+    def __init__(self, span):
+        self.alpha = 2 / (span + 1)
+        self.value = None
+
+    def push(self, x):
+        self.value = x if self.value is None else self.value + self.alpha * (x - self.value)
+
+class RollingStats:
+    """Every configured window and EMA over the return series, updated together."""
+
+    def __init__(self):
+        self.windows = {w: RollingWindow(w) for w in sorted({WINDOW, *EXTRA_STAT_WINDOWS})}
+        self.emas = {span: Ema(span) for span in EMA_SPANS}
+        self.last = 0.0
+
+    def push(self, x):
+        self.last = x
+        for window in self.windows.values():
+            window.push(x)
+        for ema in self.emas.values():
+            ema.push(x)
+
+    def mean(self, window):
+        return self.windows[window].mean()
+
+    def variance(self, window):
+        return self.windows[window].variance()
+
+    def zscore(self, window, x=None):
+        return self.windows[window].zscore(self.last if x is None else x)
+
+    def ema(self, span):
+        value = self.emas[span].value
+        return value if value is not None else 0.0
 
 # =========================
 # STATE (UNCHANGED)
@@ -75,25 +254,96 @@ EQUITY_FILE = "equity.json"
 class BotState:
     def __init__(self):
         self.closes = deque(maxlen=WINDOW + 1)
-        self.returns = deque(maxlen=WINDOW)
+        self.stats = RollingStats()  # returns: mean/variance/z-score/EMA
         self.position = "FLAT"
         self.entry_price = None
         self.balance = START_BALANCE
         self.trades = 0
         self.last_candle_ts = None
-        self.equity_curve = []
+        self.equity_pending = []  # points not yet appended to EQUITY_FILE
+        self.equity = EquityColumns(EQUITY_SPILL_DIR)
 
 state = BotState()
 
 # =========================
-# LOGGING (STDOUT + FILE)
+# LOGGING (STDOUT + FILE, BUFFERED)
 # =========================
+LOG_FLUSH_LINES = 200     # flush as soon as this many lines are waiting
+LOG_FLUSH_SECONDS = 1.0   # ...or at least this often
+
+class LogSink:
+    """Buffered log writer: log() only appends to an in-memory queue, and a
+    background task writes batches to stdout and the log file(s) off the event
+    loop. stop() drains everything; after that, lines are written immediately."""
+
+    def __init__(self):
+        self.queue = []
+        self.wakeup = None
+        self.stopping = False
+        self.closed = False
+        self.lines_buffered = 0
+        self.flushes = 0
+        self.flush_seconds_total = 0.0
+        self.flush_seconds_max = 0.0
+
+    def put(self, path, line):
+        self.lines_buffered += 1
+        if self.closed:
+            self._write([(path, line)])
+            return
+        self.queue.append((path, line))
+        if len(self.queue) >= LOG_FLUSH_LINES and self.wakeup is not None:
+            self.wakeup.set()
+
+    def _write(self, entries):
+        by_path = {}
+        for path, line in entries:
+            by_path.setdefault(path, []).append(line)
+        sys.stdout.write("\n".join(line for _, line in entries) + "\n")
+        sys.stdout.flush()
+        for path, lines in by_path.items():
+            with open(path, "a") as f:
+                f.write("\n".join(lines) + "\n")
+
+    async def flush(self):
+        if not self.queue:
+            return
+        entries, self.queue = self.queue, []
+        started = time.perf_counter()
+        await asyncio.to_thread(self._write, entries)
+        elapsed = time.perf_counter() - started
+        self.flushes += 1
+        self.flush_seconds_total += elapsed
+        self.flush_seconds_max = max(self.flush_seconds_max, elapsed)
+
+    async def run(self):
+        self.wakeup = asyncio.Event()
+        while not self.stopping:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), LOG_FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
+        await self.flush()
+
+    async def stop(self, task):
+        self.stopping = True
+        if self.wakeup is not None:
+            self.wakeup.set()
+        await task
+        self.closed = True
+
+    def stats(self):
+        avg_ms = self.flush_seconds_total / self.flushes * 1000 if self.flushes else 0.0
+        return (f"lines_buffered={self.lines_buffered} flushes={self.flushes} "
+                f"avg_flush_ms={avg_ms:.2f} max_flush_ms={self.flush_seconds_max * 1000:.2f}")
+
+log_sink = LogSink()
+
 def log(msg):
     ts = time.strftime("%Y-%m-%d %H:%M:%S")
-    line = f"[{ts}] {msg}"
-    print(line, flush=True)
-    with open(LOG_FILE, "a") as f:
-        f.write(line + "\n")
+    log_sink.put(LOG_FILE, f"[{ts}] {msg}")
 
 # =========================
 # STRATEGY (UNCHANGED)
@@ -102,7 +352,7 @@ def compute_return(new, prev):
     return (new - prev) / prev if prev else 0.0
 
 def rolling_mean():
-    return sum(state.returns) / len(state.returns) if state.returns else 0.0
+    return state.stats.mean(WINDOW)
 
 def signal_from_return(ret_pct):
     if ret_pct > LONG_THRESH:
@@ -159,19 +409,73 @@ def handle_signal(signal, price):
                 enter_long(price)
 
 # =========================
-# METRICS (UNCHANGED)
+# METRICS (APPEND-ONLY EQUITY STREAM)
 # =========================
 def record_equity(ts, price):
-    state.equity_curve.append({
+    state.equity.append(ts, state.balance, price, state.position)
+    state.equity_pending.append({
         "timestamp": ts,
         "balance": state.balance,
         "position": state.position,
         "price": price
     })
 
-    if len(state.equity_curve) % 100 == 0:
-        with open(EQUITY_FILE, "w") as f:
-            json.dump(state.equity_curve, f, indent=2)
+    if len(state.equity_pending) >= EQUITY_FLUSH_POINTS:
+        flush_equity()
+
+def flush_equity():
+    """Appends only the points recorded since the last flush; cost is per point, not per run."""
+    if not state.equity_pending:
+        return
+    with open(EQUITY_FILE, "a") as f:
+        f.write("".join(json.dumps(p, separators=(",", ":")) + "\n" for p in state.equity_pending))
+    state.equity_pending.clear()
+
+# =========================
+# DECODING (FAST PATH)
+# =========================
+try:
+    import orjson
+    json_loads = orjson.loads
+    JSON_DECODER = "orjson"
+except ImportError:
+    json_loads = json.loads
+    JSON_DECODER = "json"
+
+CANDLE_TOKEN = "candlestick_"
+CANDLE_TOKEN_BYTES = CANDLE_TOKEN.encode()
+
+class Candle(NamedTuple):
+    ts: int
+    close: float
+
+decode_stats = {"skipped": 0, "decoded": 0, "rejected": 0}
+
+def decode_candle(frame):
+    """Returns a Candle, or None for any frame that is not a usable candle.
+
+    Frames that do not even contain the candlestick type token (heartbeats,
+    most acks) are skipped with a substring check before any JSON parsing.
+    The rest are decoded and the fields are pulled straight into the tuple.
+    """
+    token = CANDLE_TOKEN_BYTES if isinstance(frame, bytes) else CANDLE_TOKEN
+    if token not in frame:
+        decode_stats["skipped"] += 1
+        return None
+    try:
+        msg = json_loads(frame)
+        if not msg.get("type", "").startswith(CANDLE_TOKEN):
+            raise ValueError(msg.get("type"))
+        candle = Candle(msg["candle_start_time"], float(msg["close"]))
+    except Exception:
+        decode_stats["rejected"] += 1  # e.g. subscription ack naming the channel, malformed frame
+        return None
+    decode_stats["decoded"] += 1
+    return candle
+
+def decode_summary():
+    return (f"decoder={JSON_DECODER} skipped={decode_stats['skipped']} "
+            f"decoded={decode_stats['decoded']} rejected={decode_stats['rejected']}")
 
 # =========================
 # DATA FEED (BOUND ONLY)
@@ -199,19 +503,18 @@ async def consume_ws():
                 log("TIME WINDOW EXPIRED — stopping run")
                 return
 
-            data = json.loads(msg)
-            parsed = parse_delta_candlestick(data)
-            if parsed is None:
+            candle = decode_candle(msg)
+            if candle is None:
                 continue
 
-            ts, close = parsed
+            ts, close = candle
             if ts == state.last_candle_ts:
                 continue
 
             state.last_candle_ts = ts
 
             if state.closes:
-                state.returns.append(compute_return(close, state.closes[-1]))
+                state.stats.push(compute_return(close, state.closes[-1]))
 
             state.closes.append(close)
 
@@ -222,14 +525,6 @@ async def consume_ws():
             handle_signal(signal, close)
             record_equity(ts, close)
 
-def parse_delta_candlestick(msg: dict):
-    if not msg.get("type", "").startswith("candlestick_"):
-        return None
-    try:
-        return msg["candle_start_time"], float(msg["close"])
-    except Exception:
-        return None
-
 # =========================
 # ARTIFACT PUBLISH
 # =========================
@@ -245,6 +540,8 @@ def upload_artifacts():
 # ENTRYPOINT (FAIL-FAST)
 # =========================
 async def main():
+    open(EQUITY_FILE, "w").close()  # each run starts a fresh stream
+    sink_task = asyncio.create_task(log_sink.run())
     log(f"RUN STARTED | max_runtime_seconds={MAX_RUNTIME_SECONDS}")
     try:
         await consume_ws()
@@ -253,6 +550,15 @@ async def main():
         log("RUN FAILED")
         log(traceback.format_exc())
         raise  # non-zero exit
+    finally:
+        log(f"DECODE | {decode_summary()}")
+        try:
+            flush_equity()
+            log(f"EQUITY SUMMARY | {format_equity_summary(state.equity.summary())}")
+        finally:
+            state.equity.close()
+        await log_sink.stop(sink_task)  # final flush before exit
+        log(f"LOG SINK | {log_sink.stats()}")
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,601 @@
+"""
+IMPORTANT NOTE -
+This code exists solely to enforce a workload contract for the project.
+
+Multi-symbol variant of web-sockets-runner-<symbol>.py: one process and one
+websocket connection subscribe to every symbol in SYMBOLS, and each symbol
+keeps its own BotState and its own artifacts. One container replaces N.
+
+The logic is intentionally simple. The purpose of this code is to demonstrate:
+- a long-running execution model
+- persistent in-memory state
+- a continuous streaming connection
+- retry-unsafe behavior
+
+This project evaluates compute selection and lifecycle control, not algorithmic sophistication or trading performance.
+
+Lifecycle Guarantees:
+- Hard stop after MAX_RUNTIME_SECONDS from process start
+- Fail-fast (non-zero exit on failure)
+- Preserves original trading logic (per symbol)
+- Local artifacts per symbol for later S3 upload
+"""
+
+import asyncio
+import json
+import math
+import time
+import traceback
+from array import array
+from collections import deque
+from typing import NamedTuple
+import os
+import shutil
+import sys
+import websockets
+import boto3
+from botocore.exceptions import ClientError
+
+# =========================
+# HARD RUNTIME BOUNDARY
+# =========================
+DEFAULT_RUNTIME_SECONDS = 2 * 60 * 60
+MAX_RUNTIME_SECONDS = int(
+    os.getenv("MAX_RUNTIME_SECONDS", DEFAULT_RUNTIME_SECONDS)
+)
+
+PROCESS_START_TS = time.time()
+
+def runtime_expired():
+    return (time.time() - PROCESS_START_TS) >= MAX_RUNTIME_SECONDS
+
+# =========================
+# OUTPUT CONFIG
+# =========================
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_PREFIX = os.getenv("S3_PREFIX", "project1/")
+
+if not S3_BUCKET:
+    raise RuntimeError("S3_BUCKET env var is required")
+
+s3 = boto3.client("s3")
+
+# =========================
+# CONFIG
+# =========================
+WS_URL = "wss://socket.india.delta.exchange"
+SYMBOLS = [s.strip().upper() for s in os.getenv("SYMBOLS", "BTCUSD,ETHUSD,BNBUSD").split(",") if s.strip()]
+
+if not SYMBOLS:
+    raise RuntimeError("SYMBOLS env var must list at least one symbol")
+
+WINDOW = 5
+LONG_THRESH = 0.005
+SHORT_THRESH = -0.005
+
+POSITION_SIZE = 1
+START_BALANCE = 10_000
+
+PING_INTERVAL = 20
+
+# Per-symbol artifacts live in <symbol>/ locally and under <S3_PREFIX><symbol>/ in S3
+LOG_FILE = "trades.log"
+EQUITY_FILE = "equity.jsonl"   # append-only, one JSON point per line (read with equity_reader.py)
+EQUITY_FLUSH_POINTS = 100      # points buffered before each append
+RUN_LOG_FILE = "run.log"
+EQUITY_SPILL_DIR = "equity_columns"
+
+# =========================
+# EQUITY COLUMNS (BOUNDED MEMORY)
+# =========================
+EQUITY_CHUNK_POINTS = 4096          # points held in memory before a chunk spills to disk
+POSITION_CODES = {"FLAT": 0, "LONG": 1, "SHORT": -1}
+MINUTES_PER_YEAR = 365 * 24 * 60    # candlestick_1m periods, for annualized Sharpe
+
+class EquityColumns:
+    """Columnar equity curve: one array.array per field for the current chunk.
+    Full chunks are appended to raw per-column files in spill_dir and read back
+    memory-mapped at the end of the run, so RSS stays flat however long it runs."""
+
+    FIELDS = (("timestamp", "q"), ("balance", "d"), ("price", "d"), ("position", "b"))
+
+    def __init__(self, spill_dir):
+        self.spill_dir = spill_dir
+        # chunks left by a killed run would otherwise be read back as this run's
+        shutil.rmtree(spill_dir, ignore_errors=True)
+        self.spilled = 0
+        self.columns = {name: array(code) for name, code in self.FIELDS}
+
+    def __len__(self):
+        return self.spilled + len(self.columns["timestamp"])
+
+    def append(self, ts, balance, price, position):
+        c = self.columns
+        c["timestamp"].append(int(ts))
+        c["balance"].append(balance)
+        c["price"].append(price)
+        c["position"].append(POSITION_CODES[position])
+        if len(c["timestamp"]) >= EQUITY_CHUNK_POINTS:
+            self.spill()
+
+    def _path(self, name):
+        return os.path.join(self.spill_dir, f"{name}.bin")
+
+    def spill(self):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        for name, column in self.columns.items():
+            with open(self._path(name), "ab") as f:
+                column.tofile(f)
+        self.spilled += len(self.columns["timestamp"])
+        self.columns = {name: array(code) for name, code in self.FIELDS}
+
+    def column(self, name):
+        """Full column as a NumPy array: memory-mapped spilled chunks + in-memory tail."""
+        import numpy as np
+        code = dict(self.FIELDS)[name]
+        tail = np.frombuffer(self.columns[name], dtype=code)
+        if not self.spilled:
+            return tail
+        head = np.memmap(self._path(name), dtype=code, mode="r", shape=(self.spilled,))
+        return np.concatenate([head, tail])
+
+    def summary(self):
+        """Vectorized end-of-run stats; None if NumPy is unavailable or nothing was recorded."""
+        try:
+            import numpy as np
+        except ImportError:
+            return None
+        if not len(self):
+            return None
+
+        balance = self.column("balance")
+        position = self.column("position")
+        drawdown = np.maximum.accumulate(balance) - balance
+        returns = np.diff(balance) / balance[:-1]
+        std = returns.std() if returns.size > 1 else 0.0
+        sharpe = float(returns.mean() / std * np.sqrt(MINUTES_PER_YEAR)) if std > 0 else 0.0
+        entries = int(np.count_nonzero((position[1:] != position[:-1]) & (position[1:] != 0)))
+        return {
+            "points": len(self),
+            "final_balance": float(balance[-1]),
+            "max_drawdown": float(drawdown.max()),
+            "sharpe": sharpe,
+            "trades": entries + int(position[0] != 0),
+        }
+
+    def close(self):
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+def format_equity_summary(stats):
+    if stats is None:
+        return "unavailable (NumPy not installed or no points)"
+    return (f"points={stats['points']} final_balance={stats['final_balance']:.2f} "
+            f"max_drawdown={stats['max_drawdown']:.2f} sharpe={stats['sharpe']:.2f} trades={stats['trades']}")
+
+# =========================
+# ROLLING STATISTICS (O(1) PER CANDLE)
+# =========================
+EXTRA_STAT_WINDOWS = ()    # e.g. (20, 60): more windows, still O(1) each per candle
+EMA_SPANS = ()             # e.g. (10, 50)
+RESYNC_EVERY = 10_000      # re-sum a window periodically to cancel floating-point drift
+
+class RollingWindow:
+    """Ring buffer with running sum and sum of squares: mean, variance and
+    z-score in O(1) per update regardless of window size."""
+
+    __slots__ = ("size", "values", "total", "total_sq", "updates")
+
+    def __init__(self, size):
+        self.size = size
+        self.values = deque(maxlen=size)
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.updates = 0
+
+    def push(self, x):
+        if len(self.values) == self.size:
+            old = self.values[0]
+            self.total -= old
+            self.total_sq -= old * old
+        self.values.append(x)
+        self.total += x
+        self.total_sq += x * x
+        self.updates += 1
+        if self.updates % RESYNC_EVERY == 0:
+            self.total = sum(self.values)
+            self.total_sq = sum(v * v for v in self.values)
+
+    def mean(self):
+        return self.total / len(self.values) if self.values else 0.0
+
+    def variance(self):
+        n = len(self.values)
+        if n < 2:
+            return 0.0
+        m = self.total / n
+        return max(self.total_sq / n - m * m, 0.0)
+
+    def zscore(self, x):
+        var = self.variance()
+        return (x - self.mean()) / math.sqrt(var) if var > 0 else 0.0
+
+class Ema:
+    __slots__ = ("alpha", "value")
+
+    def __init__(self, span):
+        self.alpha = 2 / (span + 1)
+        self.value = None
+
+    def push(self, x):
+        self.value = x if self.value is None else self.value + self.alpha * (x - self.value)
+
+class RollingStats:
+    """Every configured window and EMA over the return series, updated together."""
+
+    def __init__(self):
+        self.windows = {w: RollingWindow(w) for w in sorted({WINDOW, *EXTRA_STAT_WINDOWS})}
+        self.emas = {span: Ema(span) for span in EMA_SPANS}
+        self.last = 0.0
+
+    def push(self, x):
+        self.last = x
+        for window in self.windows.values():
+            window.push(x)
+        for ema in self.emas.values():
+            ema.push(x)
+
+    def mean(self, window):
+        return self.windows[window].mean()
+
+    def variance(self, window):
+        return self.windows[window].variance()
+
+    def zscore(self, window, x=None):
+        return self.windows[window].zscore(self.last if x is None else x)
+
+    def ema(self, span):
+        value = self.emas[span].value
+        return value if value is not None else 0.0
+
+# =========================
+# STATE (ONE PER SYMBOL)
+# =========================
+class BotState:
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.artifact_dir = symbol.lower()
+        self.closes = deque(maxlen=WINDOW + 1)
+        self.stats = RollingStats()  # returns: mean/variance/z-score/EMA
+        self.position = "FLAT"
+        self.entry_price = None
+        self.balance = START_BALANCE
+        self.trades = 0
+        self.last_candle_ts = None
+        self.equity_pending = []  # points not yet appended to EQUITY_FILE
+        self.equity = EquityColumns(self.path(EQUITY_SPILL_DIR))
+
+    def path(self, name):
+        return os.path.join(self.artifact_dir, name)
+
+states = {symbol: BotState(symbol) for symbol in SYMBOLS}
+
+# =========================
+# LOGGING (STDOUT + FILE, BUFFERED)
+# =========================
+LOG_FLUSH_LINES = 200     # flush as soon as this many lines are waiting
+LOG_FLUSH_SECONDS = 1.0   # ...or at least this often
+
+class LogSink:
+    """Buffered log writer: log() only appends to an in-memory queue, and a
+    background task writes batches to stdout and the log file(s) off the event
+    loop. stop() drains everything; after that, lines are written immediately."""
+
+    def __init__(self):
+        self.queue = []
+        self.wakeup = None
+        self.stopping = False
+        self.closed = False
+        self.lines_buffered = 0
+        self.flushes = 0
+        self.flush_seconds_total = 0.0
+        self.flush_seconds_max = 0.0
+
+    def put(self, path, line):
+        self.lines_buffered += 1
+        if self.closed:
+            self._write([(path, line)])
+            return
+        self.queue.append((path, line))
+        if len(self.queue) >= LOG_FLUSH_LINES and self.wakeup is not None:
+            self.wakeup.set()
+
+    def _write(self, entries):
+        by_path = {}
+        for path, line in entries:
+            by_path.setdefault(path, []).append(line)
+        sys.stdout.write("\n".join(line for _, line in entries) + "\n")
+        sys.stdout.flush()
+        for path, lines in by_path.items():
+            with open(path, "a") as f:
+                f.write("\n".join(lines) + "\n")
+
+    async def flush(self):
+        if not self.queue:
+            return
+        entries, self.queue = self.queue, []
+        started = time.perf_counter()
+        await asyncio.to_thread(self._write, entries)
+        elapsed = time.perf_counter() - started
+        self.flushes += 1
+        self.flush_seconds_total += elapsed
+        self.flush_seconds_max = max(self.flush_seconds_max, elapsed)
+
+    async def run(self):
+        self.wakeup = asyncio.Event()
+        while not self.stopping:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), LOG_FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
+        await self.flush()
+
+    async def stop(self, task):
+        self.stopping = True
+        if self.wakeup is not None:
+            self.wakeup.set()
+        await task
+        self.closed = True
+
+    def stats(self):
+        avg_ms = self.flush_seconds_total / self.flushes * 1000 if self.flushes else 0.0
+        return (f"lines_buffered={self.lines_buffered} flushes={self.flushes} "
+                f"avg_flush_ms={avg_ms:.2f} max_flush_ms={self.flush_seconds_max * 1000:.2f}")
+
+log_sink = LogSink()
+
+def log(msg, state=None):
+    """Run-level lines go to RUN_LOG_FILE; symbol lines go to that symbol's trades.log."""
+    ts = time.strftime("%Y-%m-%d %H:%M:%S")
+    if state is None:
+        log_sink.put(RUN_LOG_FILE, f"[{ts}] {msg}")
+    else:
+        log_sink.put(state.path(LOG_FILE), f"[{ts}] [{state.symbol}] {msg}")
+
+# =========================
+# STRATEGY (UNCHANGED, PER STATE)
+# =========================
+def compute_return(new, prev):
+    return (new - prev) / prev if prev else 0.0
+
+def rolling_mean(state):
+    return state.stats.mean(WINDOW)
+
+def signal_from_return(ret_pct):
+    if ret_pct > LONG_THRESH:
+        return 1
+    if ret_pct < SHORT_THRESH:
+        return -1
+    return 0
+
+# =========================
+# EXECUTION (UNCHANGED, PER STATE)
+# =========================
+def enter_long(state, price):
+    state.position = "LONG"
+    state.entry_price = price
+    state.trades += 1
+    log(f"ENTER LONG @ {price}", state)
+
+def enter_short(state, price):
+    state.position = "SHORT"
+    state.entry_price = price
+    state.trades += 1
+    log(f"ENTER SHORT @ {price}", state)
+
+def exit_position(state, price):
+    if state.position == "LONG":
+        pnl = (price - state.entry_price) * POSITION_SIZE
+    elif state.position == "SHORT":
+        pnl = (state.entry_price - price) * POSITION_SIZE
+    else:
+        return
+
+    state.balance += pnl
+    log(f"EXIT {state.position} @ {price} | PnL={pnl:.2f} | Balance={state.balance:.2f}", state)
+    state.position = "FLAT"
+    state.entry_price = None
+
+def handle_signal(state, signal, price):
+    if state.position == "FLAT":
+        if signal == 1:
+            enter_long(state, price)
+        elif signal == -1:
+            enter_short(state, price)
+
+    elif state.position == "LONG":
+        if signal <= 0:
+            exit_position(state, price)
+            if signal == -1:
+                enter_short(state, price)
+
+    elif state.position == "SHORT":
+        if signal >= 0:
+            exit_position(state, price)
+            if signal == 1:
+                enter_long(state, price)
+
+# =========================
+# METRICS (APPEND-ONLY EQUITY STREAM, PER STATE)
+# =========================
+def record_equity(state, ts, price):
+    state.equity.append(ts, state.balance, price, state.position)
+    state.equity_pending.append({
+        "timestamp": ts,
+        "balance": state.balance,
+        "position": state.position,
+        "price": price
+    })
+
+    if len(state.equity_pending) >= EQUITY_FLUSH_POINTS:
+        flush_equity(state)
+
+def flush_equity(state):
+    """Appends only the points recorded since the last flush; cost is per point, not per run."""
+    if not state.equity_pending:
+        return
+    with open(state.path(EQUITY_FILE), "a") as f:
+        f.write("".join(json.dumps(p, separators=(",", ":")) + "\n" for p in state.equity_pending))
+    state.equity_pending.clear()
+
+# =========================
+# DECODING (FAST PATH)
+# =========================
+try:
+    import orjson
+    json_loads = orjson.loads
+    JSON_DECODER = "orjson"
+except ImportError:
+    json_loads = json.loads
+    JSON_DECODER = "json"
+
+CANDLE_TOKEN = "candlestick_"
+CANDLE_TOKEN_BYTES = CANDLE_TOKEN.encode()
+
+class Candle(NamedTuple):
+    symbol: str
+    ts: int
+    close: float
+
+decode_stats = {"skipped": 0, "decoded": 0, "rejected": 0}
+
+def decode_candle(frame):
+    """Returns a Candle, or None for any frame that is not a usable candle.
+
+    Frames that do not even contain the candlestick type token (heartbeats,
+    most acks) are skipped with a substring check before any JSON parsing.
+    The rest are decoded and the fields are pulled straight into the tuple.
+    """
+    token = CANDLE_TOKEN_BYTES if isinstance(frame, bytes) else CANDLE_TOKEN
+    if token not in frame:
+        decode_stats["skipped"] += 1
+        return None
+    try:
+        msg = json_loads(frame)
+        if not msg.get("type", "").startswith(CANDLE_TOKEN):
+            raise ValueError(msg.get("type"))
+        candle = Candle(msg["symbol"], msg["candle_start_time"], float(msg["close"]))
+    except Exception:
+        decode_stats["rejected"] += 1  # e.g. subscription ack naming the channel, malformed frame
+        return None
+    decode_stats["decoded"] += 1
+    return candle
+
+def decode_summary():
+    return (f"decoder={JSON_DECODER} skipped={decode_stats['skipped']} "
+            f"decoded={decode_stats['decoded']} rejected={decode_stats['rejected']}")
+
+# =========================
+# DATA FEED (ONE CONNECTION, ALL SYMBOLS)
+# =========================
+async def consume_ws():
+    async with websockets.connect(
+        WS_URL,
+        ping_interval=PING_INTERVAL,
+        ping_timeout=PING_INTERVAL,
+        close_timeout=5
+    ) as ws:
+
+        sub = {
+            "type": "subscribe",
+            "payload": {
+                "channels": [{"name": "candlestick_1m", "symbols": SYMBOLS}]
+            }
+        }
+
+        await ws.send(json.dumps(sub))
+        log(f"SUBSCRIBED to {', '.join(SYMBOLS)}")
+
+        async for msg in ws:
+            if runtime_expired():
+                log("TIME WINDOW EXPIRED — stopping run")
+                return
+
+            candle = decode_candle(msg)
+            if candle is None:
+                continue
+
+            symbol, ts, close = candle
+            state = states.get(symbol)
+            if state is None or ts == state.last_candle_ts:
+                continue
+
+            state.last_candle_ts = ts
+
+            if state.closes:
+                state.stats.push(compute_return(close, state.closes[-1]))
+
+            state.closes.append(close)
+
+            ret_pct = rolling_mean(state) * 100
+            signal = signal_from_return(ret_pct)
+
+            log(f"CANDLE | Close={close} | Ret%={ret_pct:.4f} | Signal={signal}", state)
+            handle_signal(state, signal, close)
+            record_equity(state, ts, close)
+
+# =========================
+# ARTIFACT PUBLISH
+# =========================
+def upload_artifacts():
+    uploads = [(RUN_LOG_FILE, f"{S3_PREFIX}{RUN_LOG_FILE}")]
+    for state in states.values():
+        for file in [LOG_FILE, EQUITY_FILE]:
+            uploads.append((state.path(file), f"{S3_PREFIX}{state.artifact_dir}/{file}"))
+
+    for path, key in uploads:
+        if not os.path.exists(path):
+            continue
+        log(f"UPLOADING {path} → s3://{S3_BUCKET}/{key}")
+        s3.upload_file(path, S3_BUCKET, key)
+
+# =========================
+# ENTRYPOINT (FAIL-FAST)
+# =========================
+async def main():
+    for state in states.values():
+        os.makedirs(state.artifact_dir, exist_ok=True)
+        open(state.path(EQUITY_FILE), "w").close()  # each run starts a fresh stream
+
+    sink_task = asyncio.create_task(log_sink.run())
+    log(f"RUN STARTED | symbols={','.join(SYMBOLS)} | max_runtime_seconds={MAX_RUNTIME_SECONDS}")
+    completed = False
+    try:
+        await consume_ws()
+        log("RUN COMPLETED")
+        completed = True
+    except Exception:
+        log("RUN FAILED")
+        log(traceback.format_exc())
+        raise  # non-zero exit
+    finally:
+        log(f"DECODE | {decode_summary()}")
+        await log_sink.stop(sink_task)  # final flush before artifacts are uploaded
+        log(f"LOG SINK | {log_sink.stats()}")
+        for state in states.values():
+            try:
+                flush_equity(state)  # persist the tail before upload
+                log(f"EQUITY SUMMARY | {format_equity_summary(state.equity.summary())}", state)
+            finally:
+                state.equity.close()
+        try:
+            upload_artifacts()
+        except Exception:
+            log("UPLOAD FAILED")
+            log(traceback.format_exc())
+            if completed:
+                raise  # non-zero exit; otherwise keep the run's own exception
+
+if __name__ == "__main__":
+    asyncio.run(main())
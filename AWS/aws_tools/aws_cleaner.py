@@ -1,7 +1,16 @@
 import boto3
-from botocore.exceptions import ProfileNotFound, NoCredentialsError, ClientError
+from botocore.config import Config
+from botocore.exceptions import ProfileNotFound, NoCredentialsError, ClientError, BotoCoreError
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
+import argparse
+import heapq
+import io
+import json
+import os
 import sys
+import threading
+import time
 
 # =========================
 # CONFIGURATION
@@ -13,6 +22,22 @@ EC2_THRESHOLD = 2    # Aggressive: EC2 should be disposable
 S3_THRESHOLD = 30     # Moderate: Buckets often survive project phases 
 CW_THRESHOLD = 7      # Weekly: Logs should have retention set
 
+S3_PROBE_WORKERS = 32  # concurrent per-bucket emptiness probes
+
+# CloudWatch Logs storage ranking / retention remediation
+LOG_SCAN_WORKERS = 16         # regions scanned concurrently
+RETENTION_WORKERS = 16        # concurrent put_retention_policy calls
+RETENTION_TPS_PER_REGION = 4  # PutRetentionPolicy is throttled at 5 TPS per region
+DEFAULT_TOP_LOG_GROUPS = 25
+# Cost-at-risk estimation (offline price table shipped next to this script)
+PRICE_TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "aws_price_table.json")
+COST_SCAN_WORKERS = 16
+ID_FILTER_LIMIT = 200  # max values per EC2 describe_* filter
+VALID_RETENTION_DAYS = (
+    1, 3, 5, 7, 14, 30, 60, 90, 120, 150, 180, 365, 400, 545,
+    731, 1096, 1827, 2192, 2557, 2922, 3288, 3653,
+)
+
 def print_header():
     print("=" * 85)
     print("AWS CLEANER — HYGIENE & REASONING TOOL")
@@ -32,15 +57,30 @@ def get_age_days(creation_date):
     delta = now - creation_date
     return delta.days
 
-def check_ec2_hygiene(session):
-    print("\n[ EC2 HYGIENE CHECK ]")
-    print(f"{'Instance ID':<20} {'State':<12} {'Age (Days)':<12} {'Reasoning Signal'}")
-    print("-" * 85)
-    ec2 = session.client('ec2')
-    instances = ec2.describe_instances()
+_client_lock = threading.Lock()
+
+def make_client(session, service, region=None, max_connections=None):
+    # boto3 sessions are not thread-safe; clients are, once created.
+    # Size the pool to the threads sharing the client (botocore defaults to 10).
+    config = Config(max_pool_connections=max_connections) if max_connections else None
+    with _client_lock:
+        return session.client(service, region_name=region, config=config)
+
+def paginate(client, operation, result_key, **kwargs):
+    """Yields items across every page instead of stopping at the first response."""
+    for page in client.get_paginator(operation).paginate(**kwargs):
+        yield from page.get(result_key, [])
+
+def check_ec2_hygiene(session, out=sys.stdout):
+    print("\n[ EC2 HYGIENE CHECK ]", file=out)
+    print(f"{'Instance ID':<20} {'State':<12} {'Age (Days)':<12} {'Reasoning Signal'}", file=out)
+    print("-" * 85, file=out)
+    ec2 = make_client(session, 'ec2')
+    count = 0
     
-    for reservation in instances['Reservations']:
+    for reservation in paginate(ec2, 'describe_instances', 'Reservations'):
         for inst in reservation['Instances']:
+            count += 1
             name = inst.get('InstanceId')
             state = inst['State']['Name']
             age = get_age_days(inst['LaunchTime'])
@@ -51,37 +91,51 @@ def check_ec2_hygiene(session):
             elif state == 'running' and age >= EC2_THRESHOLD:
                 signal = f"DISCIPLINE ALERT (Running for {age} days. Is work done?)"
                 
-            print(f"{name:<20} {state:<12} {age:<12} {signal}")
+            print(f"{name:<20} {state:<12} {age:<12} {signal}", file=out)
+    print(f"Scanned: {count} instances", file=out)
 
-def check_s3_hygiene(session):
-    print("\n[ S3 HYGIENE CHECK ]")
-    print(f"{'Bucket Name':<35} {'Age (Days)':<12} {'Reasoning Signal'}")
-    print("-" * 85)
-    s3 = session.client('s3')
-    buckets = s3.list_buckets()['Buckets']
-    
-    for b in buckets:
-        name = b['Name']
-        age = get_age_days(b['CreationDate'])
+def bucket_is_empty(s3, name):
+    try:
         objects = s3.list_objects_v2(Bucket=name, MaxKeys=1)
-        is_empty = 'Contents' not in objects
-        
-        signal = "OK"
-        if is_empty and age >= S3_THRESHOLD:
-            signal = "ABANDONED (Empty and Old)"
-        elif is_empty:
-            signal = "IDLE (Empty but New)"
+    except ClientError:
+        return None  # one unreadable bucket must not sink the whole scan
+    return 'Contents' not in objects
+
+def check_s3_hygiene(session, out=sys.stdout):
+    print("\n[ S3 HYGIENE CHECK ]", file=out)
+    print(f"{'Bucket Name':<35} {'Age (Days)':<12} {'Reasoning Signal'}", file=out)
+    print("-" * 85, file=out)
+    s3 = make_client(session, 's3', max_connections=S3_PROBE_WORKERS)
+    buckets = s3.list_buckets()['Buckets']
+
+    # Probe every bucket concurrently; map() keeps the listing order for output
+    with ThreadPoolExecutor(max_workers=S3_PROBE_WORKERS) as pool:
+        empties = pool.map(lambda b: bucket_is_empty(s3, b['Name']), buckets)
+
+        for b, is_empty in zip(buckets, empties):
+            name = b['Name']
+            age = get_age_days(b['CreationDate'])
             
-        print(f"{name:<35} {age:<12} {signal}")
+            signal = "OK"
+            if is_empty is None:
+                signal = "UNKNOWN (Could not list objects)"
+            elif is_empty and age >= S3_THRESHOLD:
+                signal = "ABANDONED (Empty and Old)"
+            elif is_empty:
+                signal = "IDLE (Empty but New)"
+                
+            print(f"{name:<35} {age:<12} {signal}", file=out)
+    print(f"Scanned: {len(buckets)} buckets", file=out)
 
-def check_cloudwatch_hygiene(session):
-    print("\n[ CLOUDWATCH LOGS HYGIENE CHECK ]")
-    print(f"{'Log Group Name':<45} {'Retention':<12} {'Reasoning Signal'}")
-    print("-" * 85)
-    logs = session.client('logs')
-    groups = logs.describe_log_groups()['logGroups']
+def check_cloudwatch_hygiene(session, out=sys.stdout):
+    print("\n[ CLOUDWATCH LOGS HYGIENE CHECK ]", file=out)
+    print(f"{'Log Group Name':<45} {'Retention':<12} {'Reasoning Signal'}", file=out)
+    print("-" * 85, file=out)
+    logs = make_client(session, 'logs')
+    count = 0
     
-    for g in groups:
+    for g in paginate(logs, 'describe_log_groups', 'logGroups'):
+        count += 1
         name = g['logGroupName']
         retention = g.get('retentionInDays', 'Never')
         
@@ -89,14 +143,278 @@ def check_cloudwatch_hygiene(session):
         if retention == 'Never':
             signal = "HYGIENE RISK (Infinite storage enabled)"
         
-        print(f"{name:<45} {retention:<12} {signal}")
+        print(f"{name:<45} {retention:<12} {signal}", file=out)
+    print(f"Scanned: {count} log groups", file=out)
+
+# =========================
+# CLOUDWATCH LOG STORAGE (ALL REGIONS)
+# =========================
+
+def get_enabled_regions(session):
+    ec2 = make_client(session, 'ec2', 'us-east-1')
+    try:
+        return [r['RegionName'] for r in ec2.describe_regions()['Regions']]
+    except ClientError as e:
+        print(f"ERROR: Could not discover regions: {e}")
+        sys.exit(1)
+
+def _region_log_groups(session, region):
+    logs = make_client(session, 'logs', region)
+    return [(region, g['logGroupName'], g.get('retentionInDays'), g.get('storedBytes', 0))
+            for g in paginate(logs, 'describe_log_groups', 'logGroups')]
+
+def scan_log_groups(session, regions):
+    """Returns (region, name, retention or None, storedBytes) for every group, regions in parallel."""
+    groups, failed = [], []
+    with ThreadPoolExecutor(max_workers=LOG_SCAN_WORKERS) as pool:
+        futures = {pool.submit(_region_log_groups, session, r): r for r in regions}
+        for fut in as_completed(futures):
+            try:
+                groups.extend(fut.result())
+            except (ClientError, BotoCoreError) as e:
+                failed.append((futures[fut], str(e)))
+    for region, err in sorted(failed):
+        print(f"WARNING: Skipped {region}: {err}")
+    return groups
+
+def format_bytes(n):
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if n < 1024 or unit == "TiB":
+            return f"{n:.1f} {unit}" if unit != "B" else f"{n} B"
+        n /= 1024
+
+def rank_log_storage(session, top=DEFAULT_TOP_LOG_GROUPS):
+    print("\n[ CLOUDWATCH LOG STORAGE RANKING — ALL REGIONS ]")
+    groups = scan_log_groups(session, get_enabled_regions(session))
+    total = sum(g[3] for g in groups)
+    never = [g for g in groups if g[2] is None]
+
+    print(f"{'Region':<16} {'Log Group Name':<45} {'Retention':<10} {'Stored'}")
+    print("-" * 85)
+    for region, name, retention, stored in heapq.nlargest(top, groups, key=lambda g: g[3]):
+        print(f"{region:<16} {name:<45} {retention or 'Never'!s:<10} {format_bytes(stored)}")
+    print("-" * 85)
+    print(f"Log groups: {len(groups)} | Stored: {format_bytes(total)} | "
+          f"Never-expire: {len(never)} groups, {format_bytes(sum(g[3] for g in never))}")
+
+class RateLimiter:
+    """Token bucket shared by every worker calling one region's endpoint."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+def apply_retention(session, days):
+    """Sets `days` retention on every never-expire log group, after explicit approval."""
+    print(f"\n[ CLOUDWATCH RETENTION REMEDIATION — {days} DAYS ]")
+    targets = [g for g in scan_log_groups(session, get_enabled_regions(session)) if g[2] is None]
+    if not targets:
+        print("No never-expire log groups found. Nothing to do.")
+        return
+
+    per_region = {}
+    for region, _, _, stored in targets:
+        count, size = per_region.get(region, (0, 0))
+        per_region[region] = (count + 1, size + stored)
+    for region, (count, size) in sorted(per_region.items()):
+        print(f"{region:<16} {count:>6} groups  {format_bytes(size)}")
+    print(f"Total: {len(targets)} log groups")
+
+    print(f"\n>>> Set retention to {days} days on {len(targets)} log groups?")
+    print("To authorize, type exactly: APPLY-RETENTION (or press Enter to skip)")
+    if input("> ").strip() != "APPLY-RETENTION":
+        print("Cancelled. No changes made.")
+        return
+
+    limiters = {region: RateLimiter(RETENTION_TPS_PER_REGION) for region in per_region}
+    # every worker may hit the same region, so each client gets a pool that large
+    clients = {region: make_client(session, 'logs', region, max_connections=RETENTION_WORKERS) for region in per_region}
+
+    def put(target):
+        region, name, _, _ = target
+        limiters[region].acquire()
+        clients[region].put_retention_policy(logGroupName=name, retentionInDays=days)
+
+    done, failed = 0, []
+    with ThreadPoolExecutor(max_workers=RETENTION_WORKERS) as pool:
+        futures = {pool.submit(put, t): t for t in targets}
+        for fut in as_completed(futures):
+            try:
+                fut.result()
+                done += 1
+            except (ClientError, BotoCoreError) as e:
+                failed.append((futures[fut], str(e)))
+            finished = done + len(failed)
+            if finished % 100 == 0 or finished == len(targets):
+                print(f"  [{finished}/{len(targets)}] applied={done} failed={len(failed)}")
+
+    for (region, name, _, _), err in failed:
+        print(f"  [FAIL] {region} {name}: {err}")
+    print(f"Retention applied to {done} log groups, {len(failed)} failed.")
+
+# =========================
+# COST AT RISK (ESTIMATE)
+# =========================
+
+def load_price_table(path=PRICE_TABLE_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: Could not load price table {path}: {e}")
+        sys.exit(1)
+
+def volume_monthly_cost(prices, vol):
+    vtype = vol.get('VolumeType', 'gp2')
+    gb_prices = prices['ebs_gb_month']
+    cost = vol['Size'] * gb_prices.get(vtype, gb_prices['gp2'])
+    iops_price = prices['ebs_iops_month'].get(vtype)
+    if iops_price and vol.get('Iops'):
+        free = prices['gp3_free_iops'] if vtype == 'gp3' else 0
+        cost += max(vol['Iops'] - free, 0) * iops_price
+    if vtype == 'gp3' and vol.get('Throughput'):
+        extra = max(vol['Throughput'] - prices['gp3_free_throughput_mbps'], 0)
+        cost += extra * prices['gp3_throughput_mbps_month']
+    return cost
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _region_cost_findings(session, region, prices):
+    """All describe calls here are paginated and batched by ID filter, never per resource."""
+    ec2 = make_client(session, 'ec2', region)
+    findings = []  # (usd_per_month, region, kind, resource, detail)
+
+    # Stopped instances still pay for their EBS volumes
+    owners = {}
+    for r in paginate(ec2, 'describe_instances', 'Reservations',
+                      Filters=[{'Name': 'instance-state-name', 'Values': ['stopped']}]):
+        for inst in r['Instances']:
+            for bdm in inst.get('BlockDeviceMappings', []):
+                if 'Ebs' in bdm:
+                    owners[bdm['Ebs']['VolumeId']] = inst['InstanceId']
+    per_instance = {}
+    for chunk in _chunks(list(owners), ID_FILTER_LIMIT):
+        for vol in paginate(ec2, 'describe_volumes', 'Volumes',
+                            Filters=[{'Name': 'volume-id', 'Values': chunk}]):
+            cost, size = per_instance.get(owners[vol['VolumeId']], (0.0, 0))
+            per_instance[owners[vol['VolumeId']]] = (cost + volume_monthly_cost(prices, vol), size + vol['Size'])
+    for instance_id, (cost, size) in per_instance.items():
+        findings.append((cost, region, 'stopped-ec2', instance_id, f"{size} GiB EBS attached"))
+
+    for vol in paginate(ec2, 'describe_volumes', 'Volumes',
+                        Filters=[{'Name': 'status', 'Values': ['available']}]):
+        findings.append((volume_monthly_cost(prices, vol), region, 'unattached-ebs', vol['VolumeId'],
+                         f"{vol['Size']} GiB {vol.get('VolumeType', '?')}"))
+
+    eip_monthly = prices['eip_idle_hour'] * prices['hours_per_month']
+    for addr in ec2.describe_addresses().get('Addresses', []):
+        if 'AssociationId' not in addr:  # idle = not associated with anything (same test as aws_shutdown.py)
+            findings.append((eip_monthly, region, 'idle-eip', addr.get('PublicIp', '?'), addr.get('AllocationId', '')))
+
+    for _, name, retention, stored in _region_log_groups(session, region):
+        if stored:
+            findings.append((stored / 1024 ** 3 * prices['logs_gb_month'], region, 'log-storage', name,
+                             f"{format_bytes(stored)}, retention {retention or 'Never'}"))
+    return findings
+
+def report_cost_at_risk(session, top=DEFAULT_TOP_LOG_GROUPS):
+    print("\n[ COST AT RISK — ESTIMATE, ALL REGIONS ]")
+    prices = load_price_table()
+    findings = []
+    with ThreadPoolExecutor(max_workers=COST_SCAN_WORKERS) as pool:
+        futures = {pool.submit(_region_cost_findings, session, r, prices): r
+                   for r in get_enabled_regions(session)}
+        for fut in as_completed(futures):
+            try:
+                findings.extend(fut.result())
+            except (ClientError, BotoCoreError) as e:
+                # e.g. EndpointConnectionError for an opted-out region must not end the run
+                print(f"WARNING: Skipped {futures[fut]}: {e}")
+
+    print(f"{'$/month':>10}  {'Region':<16} {'Kind':<15} {'Resource':<30} {'Detail'}")
+    print("-" * 85)
+    for cost, region, kind, resource, detail in heapq.nlargest(top, findings, key=lambda f: f[0]):
+        print(f"{cost:>10.2f}  {region:<16} {kind:<15} {resource:<30} {detail}")
+    print("-" * 85)
+
+    by_kind = {}
+    for cost, _, kind, _, _ in findings:
+        by_kind[kind] = by_kind.get(kind, 0.0) + cost
+    summary = " | ".join(f"{kind} ${cost:,.2f}" for kind, cost in sorted(by_kind.items(), key=lambda kv: -kv[1]))
+    print(f"Estimated waste: ${sum(by_kind.values()):,.2f}/month ({summary or 'none'})")
+    print("Prices are offline list-price estimates (aws_price_table.json), not a bill.")
+
+HYGIENE_SCANS = (
+    ("EC2", check_ec2_hygiene),
+    ("S3", check_s3_hygiene),
+    ("CloudWatch", check_cloudwatch_hygiene),
+)
+
+def _timed_scan(check, session):
+    # Each scan writes to its own buffer so sections never interleave
+    out = io.StringIO()
+    started = time.monotonic()
+    try:
+        check(session, out=out)
+    except ClientError as e:
+        print(f"ERROR: Scan failed: {e}", file=out)
+    return out.getvalue(), time.monotonic() - started
+
+def run_hygiene_scans(session):
+    """Runs all scans concurrently, then prints each section in the usual order."""
+    with ThreadPoolExecutor(max_workers=len(HYGIENE_SCANS)) as pool:
+        futures = [(label, pool.submit(_timed_scan, check, session)) for label, check in HYGIENE_SCANS]
+        timings = []
+        for label, fut in futures:
+            text, elapsed = fut.result()
+            print(text, end="")
+            timings.append(f"{label} {elapsed:.1f}s")
+    print("\nScan timings: " + " | ".join(timings))
+
+def parse_args():
+    p = argparse.ArgumentParser(description="AWS hygiene & reasoning tool.")
+    p.add_argument("--rank-logs", action="store_true",
+                   help="Rank CloudWatch log groups by stored bytes across all enabled regions")
+    p.add_argument("--top", type=int, default=DEFAULT_TOP_LOG_GROUPS,
+                   help=f"Rows shown by --rank-logs / --cost (default: {DEFAULT_TOP_LOG_GROUPS})")
+    p.add_argument("--cost", action="store_true",
+                   help="Estimate monthly cost at risk (stopped EC2 EBS, unattached EBS, idle EIPs, log storage)")
+    p.add_argument("--apply-retention", type=int, metavar="DAYS", choices=VALID_RETENTION_DAYS,
+                   help="Set DAYS retention on every never-expire log group (requires approval)")
+    return p.parse_args()
 
 def main():
+    args = parse_args()
     session = create_session()
     print_header()
-    check_ec2_hygiene(session)
-    check_s3_hygiene(session)
-    check_cloudwatch_hygiene(session)
+
+    if args.apply_retention:
+        apply_retention(session, args.apply_retention)
+        return
+    if args.rank_logs:
+        rank_log_storage(session, args.top)
+        return
+    if args.cost:
+        report_cost_at_risk(session, args.top)
+        return
+
+    run_hygiene_scans(session)
     print("\n" + "=" * 85)
     print("ANALYSIS COMPLETE. Use Manager scripts to perform cleanup.")
     print("=" * 85)
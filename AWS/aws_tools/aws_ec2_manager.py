@@ -1,7 +1,13 @@
 import boto3
 from botocore.exceptions import ProfileNotFound, NoCredentialsError, ClientError
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import contextlib
+import csv
+import json
+import os
+import sqlite3
 import sys
+import time
 
 # =========================
 # CONFIGURATION (EXPLICIT)
@@ -9,13 +15,28 @@ import sys
 AWS_PROFILE = "phase1"
 AWS_REGION = "ap-south-1"  # change only if you intentionally want a different region
 
+# Column order shared by the table view and every export format
+INSTANCE_FIELDS = (
+    "InstanceId", "Name", "State", "Type",
+    "PublicIP", "PrivateIP", "AZ", "LaunchTime"
+)
+EXPORT_FORMATS = ("csv", "jsonl", "parquet")
+PARQUET_BATCH_ROWS = 10_000  # rows buffered per Parquet row group
 
-def print_header(mode):
-    print("=" * 70)
-    print(f"EC2 MANAGER — {mode}")
-    print(f"AWS Profile : {AWS_PROFILE}")
-    print(f"AWS Region  : {AWS_REGION}")
-    print("=" * 70)
+# Local inventory cache (SQLite, keyed by profile/account/region + instance ID)
+CACHE_FILE = os.path.join(os.path.expanduser("~"), ".aws_ec2_inventory.sqlite")
+CACHE_TTL_SECONDS = 15 * 60  # full re-list after this; incremental refresh before
+CACHE_SCHEMA_VERSION = 2    # bump to discard caches written with an older layout
+TRANSITIONAL_STATES = ("pending", "stopping", "shutting-down")
+FILTER_VALUE_LIMIT = 200     # max values per describe_instances filter
+
+
+def print_header(mode, out=sys.stdout):
+    print("=" * 70, file=out)
+    print(f"EC2 MANAGER — {mode}", file=out)
+    print(f"AWS Profile : {AWS_PROFILE}", file=out)
+    print(f"AWS Region  : {AWS_REGION}", file=out)
+    print("=" * 70, file=out)
 
 
 def create_ec2_client():
@@ -30,6 +51,24 @@ def create_ec2_client():
         sys.exit(1)
 
 
+def get_cache_scope():
+    """Cache key prefix: profile, account and region, so a profile that now
+    points at another account never serves the old account's rows."""
+    try:
+        session = boto3.Session(profile_name=AWS_PROFILE, region_name=AWS_REGION)
+        account = session.client("sts").get_caller_identity()["Account"]
+    except ProfileNotFound:
+        print("ERROR: AWS profile not found.")
+        sys.exit(1)
+    except NoCredentialsError:
+        print("ERROR: AWS credentials not available.")
+        sys.exit(1)
+    except ClientError as e:
+        print(f"ERROR: Unable to identify the AWS account: {e}")
+        sys.exit(1)
+    return f"{AWS_PROFILE}/{account}/{AWS_REGION}"
+
+
 def get_instance_name(tags):
     if not tags:
         return "N/A"
@@ -39,67 +78,229 @@ def get_instance_name(tags):
     return "N/A"
 
 
-def fetch_all_instances(ec2_client):
+def iter_instances(ec2_client, **kwargs):
+    """Yield raw instance dicts page by page instead of loading the fleet at once."""
     try:
-        response = ec2_client.describe_instances()
-        instances = []
-        for res in response["Reservations"]:
-            for inst in res["Instances"]:
-                instances.append(inst)
-        return instances
+        paginator = ec2_client.get_paginator("describe_instances")
+        for page in paginator.paginate(**kwargs):
+            for res in page["Reservations"]:
+                for inst in res["Instances"]:
+                    yield inst
     except ClientError as e:
-        print(f"ERROR: Unable to fetch EC2 data: {e}")
+        print(f"ERROR: Unable to fetch EC2 data: {e}", file=sys.stderr)
         sys.exit(1)
 
 
+def fetch_all_instances(ec2_client):
+    return list(iter_instances(ec2_client))
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _format_time(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class InstanceRecord:
+    """Compact, slot-backed view of a single EC2 instance.
+
+    State, Type and AZ repeat across a fleet, so they are interned and every
+    record shares one copy of each value. Item access (record["State"]) is
+    kept so the record is a drop-in replacement for the old per-instance dict.
+    """
+
+    __slots__ = INSTANCE_FIELDS
+
+    def __init__(self, instance):
+        self.InstanceId = instance.get("InstanceId")
+        self.Name = get_instance_name(instance.get("Tags"))
+        self.State = _intern(instance.get("State", {}).get("Name"))
+        self.Type = _intern(instance.get("InstanceType"))
+        self.PublicIP = instance.get("PublicIpAddress", "None")
+        self.PrivateIP = instance.get("PrivateIpAddress", "None")
+        self.AZ = _intern(instance.get("Placement", {}).get("AvailabilityZone"))
+        self.LaunchTime = instance.get("LaunchTime")
+
+    def __getitem__(self, key):
+        if key not in INSTANCE_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    @classmethod
+    def from_row(cls, row):
+        """Rebuild a record from a cache row (fields in INSTANCE_FIELDS order)."""
+        rec = cls.__new__(cls)
+        for field, value in zip(INSTANCE_FIELDS, row):
+            setattr(rec, field, _intern(value))
+        if rec.LaunchTime:
+            rec.LaunchTime = datetime.fromisoformat(rec.LaunchTime)
+        return rec
+
+    def as_row(self):
+        return tuple(getattr(self, field) for field in INSTANCE_FIELDS)
+
+
 def normalize_instance(obj):
     """Normalize either a reservation dict (with 'Instances') or a single instance dict.
 
-    - If given a reservation dict, returns a list of instance_data dicts.
-    - If given a single instance dict, returns a single instance_data dict.
+    - If given a reservation dict, returns a list of InstanceRecord objects.
+    - If given a single instance dict, returns a single InstanceRecord.
     """
-    def _to_data(instance):
-        return {
-            "InstanceId": instance.get("InstanceId"),
-            "Name": get_instance_name(instance.get("Tags")),
-            "State": instance.get("State", {}).get("Name"),
-            "Type": instance.get("InstanceType"),
-            "PublicIP": instance.get("PublicIpAddress", "None"),
-            "PrivateIP": instance.get("PrivateIpAddress", "None"),
-            "AZ": instance.get("Placement", {}).get("AvailabilityZone"),
-            "LaunchTime": instance.get("LaunchTime")
-        }
-
     # reservation-like object
     if isinstance(obj, dict) and "Instances" in obj:
-        instances = []
-        for inst in obj.get("Instances", []):
-            instances.append(_to_data(inst))
-        return instances
+        return [InstanceRecord(inst) for inst in obj.get("Instances", [])]
 
     # single instance dict
     if isinstance(obj, dict):
-        return _to_data(obj)
+        return InstanceRecord(obj)
 
     # fallback: return empty list
     return []
 
 
-def display_instances(instances):
-    if not instances:
-        print("No EC2 instances found.")
-        return
+# -------------------------
+# INVENTORY CACHE (SQLITE)
+# -------------------------
+_COLUMNS = ", ".join(INSTANCE_FIELDS)
+
+
+def open_cache(path=CACHE_FILE):
+    conn = sqlite3.connect(path)
+    if conn.execute("PRAGMA user_version").fetchone()[0] != CACHE_SCHEMA_VERSION:
+        # the cache is disposable: rebuild it rather than migrate
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS instances")
+            conn.execute("DROP TABLE IF EXISTS refreshes")
+            conn.execute(f"PRAGMA user_version = {CACHE_SCHEMA_VERSION}")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS instances ("
+        "scope TEXT NOT NULL, InstanceId TEXT NOT NULL, Name TEXT, State TEXT, "
+        "Type TEXT, PublicIP TEXT, PrivateIP TEXT, AZ TEXT, LaunchTime TEXT, "
+        "PRIMARY KEY (scope, InstanceId))"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_instances_state ON instances (scope, State)")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS refreshes (scope TEXT PRIMARY KEY, refreshed_at REAL NOT NULL)"
+    )
+    return conn
+
 
-    print(
-        f"{'Instance ID':<20} {'Name':<20} {'State':<10} "
-        f"{'Type':<12} {'Public IP':<15} {'AZ':<12} {'Launch Time'}"
+def _store_records(conn, scope, records):
+    placeholders = ", ".join("?" * (len(INSTANCE_FIELDS) + 1))
+    conn.executemany(
+        f"INSERT OR REPLACE INTO instances (scope, {_COLUMNS}) VALUES ({placeholders})",
+        ((scope, *(_format_time(v) for v in rec.as_row())) for rec in records)
     )
-    print("-" * 120)
 
+
+def _launch_day_patterns(since):
+    """launch-time filter values (one wildcard per UTC day) from `since` until today."""
+    day = since.astimezone(timezone.utc).date()
+    today = datetime.now(timezone.utc).date()
+    patterns = []
+    while day <= today and len(patterns) < FILTER_VALUE_LIMIT:
+        patterns.append(f"{day.isoformat()}T*")
+        day += timedelta(days=1)
+    return patterns
+
+
+def refresh_cache(conn, ec2_client, scope, force=False):
+    """Bring the cached inventory for scope (see get_cache_scope) up to date.
+
+    Past the TTL (or with force=True) the region is re-listed in full. Within
+    the TTL only instances in a transitional state are re-queried by ID, plus
+    anything launched since the newest cached launch time. Returns "full" or
+    "incremental".
+    """
+    now = time.time()
+    row = conn.execute(
+        "SELECT refreshed_at FROM refreshes WHERE scope = ?", (scope,)
+    ).fetchone()
+
+    if force or row is None or now - row[0] > CACHE_TTL_SECONDS:
+        with conn:
+            conn.execute("DELETE FROM instances WHERE scope = ?", (scope,))
+            _store_records(conn, scope, (InstanceRecord(i) for i in iter_instances(ec2_client)))
+            conn.execute(
+                "INSERT OR REPLACE INTO refreshes (scope, refreshed_at) VALUES (?, ?)",
+                (scope, now)
+            )
+        return "full"
+
+    with conn:
+        placeholders = ", ".join("?" * len(TRANSITIONAL_STATES))
+        transitional = [r[0] for r in conn.execute(
+            f"SELECT InstanceId FROM instances WHERE scope = ? AND State IN ({placeholders})",
+            (scope, *TRANSITIONAL_STATES)
+        )]
+        for start in range(0, len(transitional), FILTER_VALUE_LIMIT):
+            chunk = transitional[start:start + FILTER_VALUE_LIMIT]
+            fresh = [InstanceRecord(i) for i in iter_instances(
+                ec2_client, Filters=[{"Name": "instance-id", "Values": chunk}]
+            )]
+            _store_records(conn, scope, fresh)
+            # Terminated instances eventually drop out of describe_instances
+            gone = set(chunk) - {rec.InstanceId for rec in fresh}
+            conn.executemany(
+                "DELETE FROM instances WHERE scope = ? AND InstanceId = ?",
+                ((scope, instance_id) for instance_id in gone)
+            )
+
+        newest = conn.execute(
+            "SELECT MAX(LaunchTime) FROM instances WHERE scope = ?", (scope,)
+        ).fetchone()[0]
+        since = datetime.fromtimestamp(row[0], timezone.utc)
+        if newest:
+            since = max(since, datetime.fromisoformat(newest))
+        _store_records(conn, scope, (InstanceRecord(i) for i in iter_instances(
+            ec2_client, Filters=[{"Name": "launch-time", "Values": _launch_day_patterns(since)}]
+        )))
+    return "incremental"
+
+
+def iter_cached_instances(conn, scope, state=None):
+    query = f"SELECT {_COLUMNS} FROM instances WHERE scope = ?"
+    params = [scope]
+    if state:
+        query += " AND State = ?"
+        params.append(state)
+    for row in conn.execute(query + " ORDER BY LaunchTime", params):
+        yield InstanceRecord.from_row(row)
+
+
+def mark_transitional(conn, scope, instance_id, state):
+    """Flag an instance we just acted on so the next refresh re-queries it."""
+    with conn:
+        conn.execute(
+            "UPDATE instances SET State = ? WHERE scope = ? AND InstanceId = ?",
+            (state, scope, instance_id)
+        )
+
+
+def load_inventory(ec2_client, scope, force_refresh=False, out=sys.stdout):
+    conn = open_cache()
+    mode = refresh_cache(conn, ec2_client, scope, force=force_refresh)
+    print(f"Inventory   : local cache ({mode} refresh, TTL {CACHE_TTL_SECONDS}s)", file=out)
+    return conn
+
+
+def display_instances(instances):
+    """Print rows as they arrive; `instances` may be any iterable, including a generator."""
+    total_count = 0
     running_count = 0
     stopped_count = 0
 
     for inst in instances:
+        if total_count == 0:
+            print(
+                f"{'Instance ID':<20} {'Name':<20} {'State':<10} "
+                f"{'Type':<12} {'Public IP':<15} {'AZ':<12} {'Launch Time'}"
+            )
+            print("-" * 120)
+        total_count += 1
+
         launch_time = inst["LaunchTime"]
         if isinstance(launch_time, datetime):
             launch_time = launch_time.strftime("%Y-%m-%d %H:%M:%S")
@@ -114,8 +315,78 @@ def display_instances(instances):
         elif inst["State"] == "stopped":
             stopped_count += 1
 
+    if total_count == 0:
+        print("No EC2 instances found.")
+        return
+
     print("-" * 120)
-    print(f"Total instances : {len(instances)}",  f"Running : {running_count}", f"Stopped : {stopped_count}")
+    print(f"Total instances : {total_count}",  f"Running : {running_count}", f"Stopped : {stopped_count}")
+
+
+# -------------------------
+# EXPORT (STREAMING)
+# -------------------------
+def export_instances(instances, fmt, path=None):
+    """Stream records as CSV / JSON Lines (stdout or file) or Parquet (file only).
+
+    Rows are written as they are produced, so memory stays flat regardless of
+    fleet size. Returns the number of rows written.
+    """
+    if fmt == "parquet":
+        return _export_parquet(instances, path)
+
+    out = open(path, "w", newline="") if path else sys.stdout
+    count = 0
+    try:
+        if fmt == "csv":
+            writer = csv.writer(out)
+            writer.writerow(INSTANCE_FIELDS)
+            for rec in instances:
+                writer.writerow([_format_time(v) for v in rec.as_row()])
+                count += 1
+        else:
+            for rec in instances:
+                row = dict(zip(INSTANCE_FIELDS, rec.as_row()))
+                row["LaunchTime"] = _format_time(row["LaunchTime"])
+                out.write(json.dumps(row) + "\n")
+                count += 1
+    finally:
+        if path:
+            out.close()
+    return count
+
+
+def _export_parquet(instances, path):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("ERROR: Parquet export requires pyarrow (pip install pyarrow).", file=sys.stderr)
+        sys.exit(1)
+
+    if not path:
+        print("ERROR: Parquet export needs an output path.", file=sys.stderr)
+        sys.exit(1)
+
+    schema = pa.schema(
+        [(field, pa.string()) for field in INSTANCE_FIELDS[:-1]] +
+        [("LaunchTime", pa.timestamp("us", tz="UTC"))]
+    )
+    columns = {field: [] for field in INSTANCE_FIELDS}
+    count = 0
+
+    with pq.ParquetWriter(path, schema) as writer:
+        for rec in instances:
+            for field, value in zip(INSTANCE_FIELDS, rec.as_row()):
+                columns[field].append(value)
+            count += 1
+            if count % PARQUET_BATCH_ROWS == 0:
+                writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+                columns = {field: [] for field in INSTANCE_FIELDS}
+        if columns["InstanceId"]:
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+
+    return count
 
 
 def confirm_action(instance, action):
@@ -166,44 +437,38 @@ def perform_action(ec2_client, instance, action):
         sys.exit(1)
 
 
-def main():
-    if len(sys.argv) == 1:
-        print_header("PHASE A — READ-ONLY")
-        ec2 = create_ec2_client()
-        raw_instances = fetch_all_instances(ec2)
-        instances = [normalize_instance(i) for i in raw_instances]
-        display_instances(instances)
-        print("\nRead-only inspection complete.")
-        return
-
-    if len(sys.argv) != 3:
-        print("Usage:")
-        print("  python aws_ec2_manager.py")
-        print("  python D:\Projects\_tools\aws_tools\aws_ec2_manager.py <start|stop|reboot|terminate> <instance-id>")
-        sys.exit(1)
+ACTION_TRANSITIONS = {
+    "start": "pending",
+    "stop": "stopping",
+    "terminate": "shutting-down",
+}
 
-    action = sys.argv[1]
-    instance_id = sys.argv[2]
 
-    if action not in ["start", "stop", "reboot", "terminate"]:
-        print("ERROR: Invalid action. Allowed: start, stop, reboot, terminate.")
+def describe_instance(ec2_client, instance_id):
+    """Live read of one instance; None if the ID does not exist in this region."""
+    try:
+        reservations = ec2_client.describe_instances(InstanceIds=[instance_id])["Reservations"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("InvalidInstanceID.NotFound", "InvalidInstanceID.Malformed"):
+            return None
+        print(f"ERROR: Unable to fetch EC2 data: {e}")
         sys.exit(1)
+    for res in reservations:
+        for inst in res["Instances"]:
+            return inst
+    return None
 
-    phase = "PHASE C" if action == "terminate" else "PHASE B"
-    print_header(f"{phase} — {action.upper()}")
 
-    ec2 = create_ec2_client()
-    raw_instances = fetch_all_instances(ec2)
-
-    target = None
-    for inst in raw_instances:
-        if inst["InstanceId"] == instance_id:
-            target = normalize_instance(inst)
-            break
-
-    if not target:
+def run_action(ec2, conn, scope, action, instance_id):
+    # Never act on cached state: always re-read the target itself before
+    # confirming. This also covers instances launched since the last refresh.
+    live = describe_instance(ec2, instance_id)
+    if live is None:
         print("ERROR: Instance ID not found.")
         sys.exit(1)
+    target = normalize_instance(live)
+    with conn:
+        _store_records(conn, scope, [target])
 
     if action == "start" and target["State"] != "stopped":
         print("ERROR: Instance is not in stopped state.")
@@ -216,16 +481,82 @@ def main():
     if action == "terminate":
         if confirm_termination(target):
             perform_action(ec2, target, action)
+            mark_transitional(conn, scope, instance_id, ACTION_TRANSITIONS[action])
             print("\nTERMINATION initiated successfully.")
         else:
             print("\nTermination cancelled. No action taken.")
     else:
         if confirm_action(target, action):
             perform_action(ec2, target, action)
+            if action in ACTION_TRANSITIONS:
+                mark_transitional(conn, scope, instance_id, ACTION_TRANSITIONS[action])
             print(f"\nAction '{action}' initiated successfully.")
         else:
             print("\nAction cancelled by user.")
 
 
+def main():
+    args = sys.argv[1:]
+    force_refresh = "--refresh" in args
+    if force_refresh:
+        args.remove("--refresh")
+
+    state_filter = None
+    if "--state" in args:
+        idx = args.index("--state")
+        if idx + 1 >= len(args):
+            print("ERROR: --state requires a value (e.g. running, stopped).")
+            sys.exit(1)
+        state_filter = args[idx + 1]
+        del args[idx:idx + 2]
+
+    if not args:
+        print_header("PHASE A — READ-ONLY")
+        ec2 = create_ec2_client()
+        scope = get_cache_scope()
+        with contextlib.closing(load_inventory(ec2, scope, force_refresh)) as conn:
+            display_instances(iter_cached_instances(conn, scope, state_filter))
+        print("\nRead-only inspection complete.")
+        return
+
+    if args[0] == "--export":
+        if len(args) not in (2, 3) or args[1] not in EXPORT_FORMATS:
+            print("Usage: python aws_ec2_manager.py --export <csv|jsonl|parquet> [output-path]")
+            sys.exit(1)
+        fmt = args[1]
+        path = args[2] if len(args) == 3 else None
+
+        # Header goes to stderr so stdout stays a clean data stream for pipes
+        print_header(f"PHASE A — READ-ONLY EXPORT ({fmt.upper()})", out=sys.stderr)
+        ec2 = create_ec2_client()
+        scope = get_cache_scope()
+        with contextlib.closing(load_inventory(ec2, scope, force_refresh, out=sys.stderr)) as conn:
+            count = export_instances(iter_cached_instances(conn, scope, state_filter), fmt, path)
+        print(f"Exported {count} instances{f' to {path}' if path else ''}.", file=sys.stderr)
+        return
+
+    if len(args) != 2:
+        print("Usage:")
+        print("  python aws_ec2_manager.py [--state <state>] [--refresh]")
+        print("  python aws_ec2_manager.py --export <csv|jsonl|parquet> [output-path] [--state <state>] [--refresh]")
+        print("  python D:\Projects\_tools\aws_tools\aws_ec2_manager.py <start|stop|reboot|terminate> <instance-id>")
+        sys.exit(1)
+
+    action = args[0]
+    instance_id = args[1]
+
+    if action not in ["start", "stop", "reboot", "terminate"]:
+        print("ERROR: Invalid action. Allowed: start, stop, reboot, terminate.")
+        sys.exit(1)
+
+    phase = "PHASE C" if action == "terminate" else "PHASE B"
+    print_header(f"{phase} — {action.upper()}")
+
+    ec2 = create_ec2_client()
+    scope = get_cache_scope()
+    with contextlib.closing(load_inventory(ec2, scope, force_refresh)) as conn:
+        run_action(ec2, conn, scope, action, instance_id)
+
+
 if __name__ == "__main__":
     main()
@@ -1,12 +1,47 @@
 import boto3
 from botocore.exceptions import ProfileNotFound, NoCredentialsError, ClientError
+import argparse
+import csv
+import io
+import json
+import os
+import re
 import sys
-from datetime import datetime
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
 
 # =========================
 # CONFIGURATION (EXPLICIT)
 # =========================
 AWS_PROFILE = "phase1"
+CREDENTIAL_REPORT_TIMEOUT = 60  # seconds to wait for IAM to build the report
+CREDENTIAL_REPORT_POLL = 2
+
+# Per-principal detail calls: bounded pool, globally rate-limited (IAM quotas are account-wide)
+IAM_DETAIL_WORKERS = 8
+IAM_CALLS_PER_SECOND = 10
+
+# Credential report columns kept per user (everything else is dropped while parsing)
+REPORT_FIELDS = (
+    "password_enabled", "password_last_used", "mfa_active",
+    "access_key_1_active", "access_key_1_last_rotated", "access_key_1_last_used_date",
+    "access_key_2_active", "access_key_2_last_rotated", "access_key_2_last_used_date",
+)
+
+# Offline permission index (who-can queries); holds policy documents, so owner-only
+PERMISSION_INDEX_FILE = os.path.join(os.path.expanduser("~"), ".aws_iam_permission_index.json")
+PERMISSION_INDEX_TTL_SECONDS = 24 * 3600
+INVENTORY_FILTER = ("User", "Role", "LocalManagedPolicy")
+PERMISSION_FILTER = ("User", "Role", "Group", "LocalManagedPolicy", "AWSManagedPolicy")
+
+# Service-last-accessed analysis: jobs run inside IAM, all submitted up front then polled together
+LAST_ACCESSED_TIMEOUT = 300
+LAST_ACCESSED_POLL = 2
+UNUSED_AFTER_DAYS = 90
 
 
 def print_header():
@@ -29,18 +64,59 @@ def create_iam_client():
         sys.exit(1)
 
 
+# -------------------------
+# RATE-LIMITED CALLS
+# -------------------------
+class RateLimiter:
+    """Token bucket shared by every thread calling IAM (a single global endpoint)."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+iam_limiter = RateLimiter(IAM_CALLS_PER_SECOND)
+
+
+def paginate(iam, operation, result_key, **kwargs):
+    """Yields items across all pages, spending one rate-limit token per page."""
+    pages = iter(iam.get_paginator(operation).paginate(**kwargs))
+    while True:
+        iam_limiter.acquire()
+        try:
+            page = next(pages)
+        except StopIteration:
+            return
+        yield from page.get(result_key, [])
+
+
 # -------------------------
 # IAM USERS
 # -------------------------
 def list_iam_users(iam):
     try:
-        return iam.list_users().get("Users", [])
+        return list(paginate(iam, "list_users", "Users"))
     except ClientError as e:
         print(f"ERROR: Unable to list IAM users: {e}")
         sys.exit(1)
 
 
 def user_has_console_access(iam, username):
+    iam_limiter.acquire()
     try:
         iam.get_login_profile(UserName=username)
         return True
@@ -50,20 +126,16 @@ def user_has_console_access(iam, username):
 
 def count_access_keys(iam, username):
     try:
-        keys = iam.list_access_keys(UserName=username)
-        return len(keys.get("AccessKeyMetadata", []))
+        return sum(1 for _ in paginate(iam, "list_access_keys", "AccessKeyMetadata", UserName=username))
     except ClientError:
         return 0
 
 
 def count_user_policies(iam, username):
     try:
-        attached = iam.list_attached_user_policies(UserName=username)
-        inline = iam.list_user_policies(UserName=username)
-        return (
-            len(attached.get("AttachedPolicies", [])) +
-            len(inline.get("PolicyNames", []))
-        )
+        attached = paginate(iam, "list_attached_user_policies", "AttachedPolicies", UserName=username)
+        inline = paginate(iam, "list_user_policies", "PolicyNames", UserName=username)
+        return sum(1 for _ in attached) + sum(1 for _ in inline)
     except ClientError:
         return 0
 
@@ -73,7 +145,7 @@ def count_user_policies(iam, username):
 # -------------------------
 def list_iam_roles(iam):
     try:
-        return iam.list_roles().get("Roles", [])
+        return list(paginate(iam, "list_roles", "Roles"))
     except ClientError as e:
         print(f"ERROR: Unable to list IAM roles: {e}")
         sys.exit(1)
@@ -97,35 +169,640 @@ def extract_trusted_services(role):
 # -------------------------
 def list_customer_policies(iam):
     try:
-        return iam.list_policies(Scope="Local").get("Policies", [])
+        return list(paginate(iam, "list_policies", "Policies", Scope="Local"))
     except ClientError as e:
         print(f"ERROR: Unable to list IAM policies: {e}")
         sys.exit(1)
 
 
+# -------------------------
+# BULK INVENTORY
+# -------------------------
+def fetch_authorization_details(iam, filters=INVENTORY_FILTER):
+    """Users, roles and customer policies (with attachments, inline policies and
+    trust documents) from one paginated call. Returns None if not permitted."""
+    details = {"UserDetailList": [], "RoleDetailList": [], "GroupDetailList": [], "Policies": []}
+    try:
+        paginator = iam.get_paginator("get_account_authorization_details")
+        for page in paginator.paginate(Filter=list(filters)):
+            for key in details:
+                details[key].extend(page.get(key, []))
+    except ClientError as e:
+        print(f"NOTE: Bulk IAM inventory unavailable ({e.response['Error']['Code']}); using per-item calls.")
+        return None
+    return details
+
+
+def fetch_credential_report(iam):
+    """Returns {username: report row}, or None if the report cannot be produced."""
+    deadline = time.monotonic() + CREDENTIAL_REPORT_TIMEOUT
+    try:
+        while iam.generate_credential_report()["State"] != "COMPLETE":
+            if time.monotonic() > deadline:
+                print("NOTE: Credential report not ready in time; using per-user calls.")
+                return None
+            time.sleep(CREDENTIAL_REPORT_POLL)
+        content = iam.get_credential_report()["Content"]
+    except ClientError as e:
+        print(f"NOTE: Credential report unavailable ({e.response['Error']['Code']}); using per-user calls.")
+        return None
+    return dict(parse_credential_report(content))
+
+
+def parse_credential_report(content):
+    """Streams the report CSV row by row, keeping only REPORT_FIELDS for each user."""
+    reader = csv.DictReader(io.TextIOWrapper(io.BytesIO(content), encoding="utf-8", newline=""))
+    for row in reader:
+        yield row["user"], {field: row.get(field, "N/A") for field in REPORT_FIELDS}
+
+
+def summarize_user(iam, username, created, policy_count, report):
+    """One user row; falls back to per-user calls only for fields the bulk data lacks."""
+    if policy_count is None:
+        policy_count = count_user_policies(iam, username)
+    row = report.get(username) if report else None
+    if row:
+        console = row["password_enabled"] == "true"
+        # every key the user has, active or not, as list_access_keys counts them
+        keys = sum(row[f"access_key_{n}_last_rotated"] not in ("N/A", "") for n in (1, 2))
+    else:
+        console = user_has_console_access(iam, username)
+        keys = count_access_keys(iam, username)
+    return {"UserName": username, "CreateDate": created,
+            "Console": console, "Keys": keys, "Policies": policy_count}
+
+
+def load_inventory(iam):
+    """Builds {users, roles, policies, report}, preferring bulk calls over per-principal ones.
+
+    The credential report is generated and polled on a background thread while
+    the user/role/policy listings run, so its build time is mostly hidden.
+    """
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        report_future = pool.submit(fetch_credential_report, iam)
+        details = fetch_authorization_details(iam)
+        if details is None:
+            user_list = list_iam_users(iam)
+            roles = list_iam_roles(iam)
+            policies = list_customer_policies(iam)
+            policy_counts = {}  # counted per user inside the worker pool
+        else:
+            user_list = details["UserDetailList"]
+            roles = details["RoleDetailList"]
+            policies = details["Policies"]
+            policy_counts = {
+                u["UserName"]: len(u.get("AttachedManagedPolicies", [])) + len(u.get("UserPolicyList", []))
+                for u in user_list
+            }
+        report = report_future.result()
+
+    return {
+        "users": iter_user_rows(iam, user_list, policy_counts, report),
+        "roles": sorted(roles, key=lambda r: r["RoleName"]),
+        "policies": sorted(policies, key=lambda p: p["PolicyName"]),
+        "report": report,
+    }
+
+
+def iter_user_rows(iam, user_list, policy_counts, report):
+    """Yields user rows sorted by name while per-user calls run in a bounded pool.
+
+    pool.map submits every user up front but yields strictly in input order, so
+    rows stream out as soon as the next name in order is ready.
+    """
+    users = sorted(user_list, key=lambda u: u["UserName"])
+    with ThreadPoolExecutor(max_workers=IAM_DETAIL_WORKERS) as pool:
+        yield from pool.map(
+            lambda u: summarize_user(iam, u["UserName"], u["CreateDate"],
+                                     policy_counts.get(u["UserName"]), report),
+            users
+        )
+
+
+# -------------------------
+# PERMISSION INDEX (OFFLINE QUERIES)
+# -------------------------
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _load_document(document):
+    # boto3 already decodes policy documents; raw API output is URL-encoded JSON
+    if isinstance(document, str):
+        return json.loads(urllib.parse.unquote(document))
+    return document or {}
+
+
+def _default_document(policy):
+    for version in policy.get("PolicyVersionList", []):
+        if version.get("IsDefaultVersion"):
+            return version.get("Document")
+    return None
+
+
+def normalize_statements(document):
+    """Flattens a policy document into one dict per statement.
+
+    Action patterns are lower-cased (IAM actions are case-insensitive);
+    resources keep their case. Conditions are not evaluated, only flagged.
+    """
+    for stmt in _as_list(_load_document(document).get("Statement")):
+        yield {
+            "effect": stmt.get("Effect", "Allow"),
+            "actions": [a.lower() for a in _as_list(stmt.get("Action"))],
+            "not_actions": [a.lower() for a in _as_list(stmt.get("NotAction"))],
+            "resources": _as_list(stmt.get("Resource")),
+            "not_resources": _as_list(stmt.get("NotResource")),
+            "conditional": bool(stmt.get("Condition")),
+        }
+
+
+def iter_policy_documents(details):
+    """Yields (principal, policy label, document) for every identity policy in
+    effect on a user or role. Group policies are attributed to each member."""
+    managed = {p["Arn"]: (p["PolicyName"], _default_document(p)) for p in details["Policies"]}
+
+    group_docs = {}
+    for g in details["GroupDetailList"]:
+        docs = [(p["PolicyName"], p["PolicyDocument"]) for p in g.get("GroupPolicyList", [])]
+        docs += [managed[a["PolicyArn"]] for a in g.get("AttachedManagedPolicies", [])
+                 if a["PolicyArn"] in managed]
+        group_docs[g["GroupName"]] = docs
+
+    for kind, list_key, name_key, inline_key in (
+        ("user", "UserDetailList", "UserName", "UserPolicyList"),
+        ("role", "RoleDetailList", "RoleName", "RolePolicyList"),
+    ):
+        for entity in details[list_key]:
+            principal = f"{kind}/{entity[name_key]}"
+            for p in entity.get(inline_key, []):
+                yield principal, f"{p['PolicyName']} (inline)", p["PolicyDocument"]
+            for a in entity.get("AttachedManagedPolicies", []):
+                if a["PolicyArn"] in managed:
+                    yield (principal, *managed[a["PolicyArn"]])
+            for group in entity.get("GroupList", []):
+                for name, document in group_docs.get(group, []):
+                    yield principal, f"{name} (group {group})", document
+
+
+def _is_wildcard(pattern):
+    return "*" in pattern or "?" in pattern or "${" in pattern
+
+
+def _action_bucket(pattern):
+    service = pattern.split(":", 1)[0] if ":" in pattern else "*"
+    return "*" if _is_wildcard(service) else service
+
+
+def _resource_bucket(pattern):
+    parts = pattern.split(":", 3)
+    if len(parts) < 4 or parts[0] != "arn" or _is_wildcard(parts[2]):
+        return "*"
+    return parts[2]
+
+
+@lru_cache(maxsize=None)
+def _wildcard_regex(pattern):
+    body = re.escape(pattern)
+    body = re.sub(r"\\\$\\\{[^}]*\\\}", r"\\*", body)  # policy variables (${aws:username}) match anything
+    body = body.replace(r"\*", ".*").replace(r"\?", ".")
+    return re.compile(body + r"\Z", re.DOTALL)
+
+
+def _matches(pattern, value):
+    return pattern == value or (_is_wildcard(pattern) and _wildcard_regex(pattern).match(value) is not None)
+
+
+def _glob_tokens(pattern):
+    """Pattern as a tuple of literal characters and "*"/"?" wildcards."""
+    return tuple(re.sub(r"\$\{[^}]*\}", "*", pattern))  # policy variables match anything
+
+
+@lru_cache(maxsize=None)
+def _overlaps(a, b):
+    """True if at least one string matches both wildcard patterns."""
+    a, b = _glob_tokens(a), _glob_tokens(b)
+
+    @lru_cache(maxsize=None)
+    def walk(i, j):
+        if i == len(a) and j == len(b):
+            return True
+        if i < len(a) and a[i] == "*":
+            return walk(i + 1, j) or (j < len(b) and walk(i, j + 1))
+        if j < len(b) and b[j] == "*":
+            return walk(i, j + 1) or (i < len(a) and walk(i + 1, j))
+        if i == len(a) or j == len(b):
+            return False
+        return (a[i] == "?" or b[j] == "?" or a[i] == b[j]) and walk(i + 1, j + 1)
+
+    return walk(0, 0)
+
+
+@lru_cache(maxsize=None)
+def _covers(pattern, query):
+    """True if every string matching query also matches pattern. A "*" in the
+    query can only be absorbed by a "*" in the pattern, never by "?"."""
+    if pattern == query:
+        return True
+    body = re.escape(pattern)
+    body = re.sub(r"\\\$\\\{[^}]*\\\}", r"\\*", body)
+    body = body.replace(r"\*", ".*").replace(r"\?", "[^*]")
+    return re.match(body + r"\Z", query, re.DOTALL) is not None
+
+
+def build_permission_index(details):
+    """Normalizes every statement into a grant and builds two inverted indexes:
+    action pattern -> grant ids (bucketed by service prefix) and resource ->
+    grant ids (exact ARNs in a dict, wildcard patterns bucketed by ARN service).
+
+    NotAction/NotResource statements cannot be inverted and are kept in a
+    short list that queries scan directly.
+    """
+    grants = []
+    actions = {}
+    resources = {"exact": {}, "pattern": {}}
+    inverted = []
+    policies = set()
+    for principal, policy, document in iter_policy_documents(details):
+        if document is None:
+            continue
+        policies.add(policy)
+        for stmt in normalize_statements(document):
+            gid = len(grants)
+            grants.append({"principal": principal, "policy": policy, **stmt})
+            if stmt["not_actions"] or stmt["not_resources"]:
+                inverted.append(gid)
+                continue
+            for pattern in stmt["actions"]:
+                actions.setdefault(_action_bucket(pattern), {}).setdefault(pattern, []).append(gid)
+            for pattern in stmt["resources"]:
+                if _is_wildcard(pattern):
+                    resources["pattern"].setdefault(_resource_bucket(pattern), {}).setdefault(pattern, []).append(gid)
+                else:
+                    resources["exact"].setdefault(pattern, []).append(gid)
+    return {
+        "built": time.time(),
+        "policies": len(policies),
+        "grants": grants,
+        "actions": actions,
+        "resources": resources,
+        "inverted": inverted,
+    }
+
+
+def save_permission_index(index, path=PERMISSION_INDEX_FILE):
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(index, f, separators=(",", ":"))
+    except OSError as e:
+        print(f"WARNING: Could not write permission index {path}: {e}")
+
+
+def load_permission_index(refresh=False, path=PERMISSION_INDEX_FILE):
+    """Returns the cached index if it is fresh, otherwise downloads every policy
+    document in one authorization-details pass and rebuilds it."""
+    if not refresh:
+        try:
+            with open(path) as f:
+                index = json.load(f)
+            if time.time() - index["built"] < PERMISSION_INDEX_TTL_SECONDS:
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+
+    print("Building permission index (downloading all policy documents)...")
+    details = fetch_authorization_details(create_iam_client(), PERMISSION_FILTER)
+    if details is None:
+        print("ERROR: get_account_authorization_details is required to build the permission index.")
+        sys.exit(1)
+    index = build_permission_index(details)
+    save_permission_index(index, path)
+    return index
+
+
+def _grant_matches(grant, action, resource):
+    """Full check of one grant; used for NotAction/NotResource statements."""
+    if grant["actions"] and not any(_matches(p, action) for p in grant["actions"]):
+        return False
+    if any(_matches(p, action) for p in grant["not_actions"]):
+        return False
+    if resource is not None:
+        if grant["resources"] and not any(_overlaps(p, resource) for p in grant["resources"]):
+            return False
+        if any(_covers(p, resource) for p in grant["not_resources"]):
+            return False
+    return True
+
+
+def _resource_scope(grant, resource):
+    """None if the grant covers the whole queried resource (an omitted resource
+    means "*"); otherwise the part of it the grant is limited to, for display."""
+    query = "*" if resource is None else resource
+    if not _is_wildcard(query):
+        return None  # a concrete ARN was already matched against the grant
+    if grant["not_resources"]:
+        excluded = [p for p in grant["not_resources"] if _overlaps(p, query)]
+        return "all but " + ", ".join(excluded) if excluded else None
+    if any(_covers(p, query) for p in grant["resources"]):
+        return None
+    return ", ".join(p for p in grant["resources"] if _overlaps(p, query))
+
+
+def who_can(index, action, resource=None):
+    """Returns {principal: [(policy, effect, conditional, scope), ...]} for every
+    grant whose action (and resource, if given) patterns match. A resource with
+    wildcards is treated as a pattern: grants on any part of it match. scope is
+    None when the grant covers the queried resource, see _resource_scope()."""
+    action = action.lower()
+    candidates = set()
+    for bucket in {_action_bucket(action), "*"}:
+        for pattern, gids in index["actions"].get(bucket, {}).items():
+            if _matches(pattern, action):
+                candidates.update(gids)
+
+    if resource is not None:
+        patterns = index["resources"]["pattern"]
+        if _is_wildcard(resource):
+            on_resource = {gid for arn, gids in index["resources"]["exact"].items()
+                           if _matches(resource, arn) for gid in gids}
+            bucket = _resource_bucket(resource)
+            buckets = list(patterns) if bucket == "*" else [bucket, "*"]
+            hit = _overlaps
+        else:
+            on_resource = set(index["resources"]["exact"].get(resource, []))
+            buckets = [_resource_bucket(resource), "*"]
+            hit = _matches
+        for bucket in set(buckets):
+            for pattern, gids in patterns.get(bucket, {}).items():
+                if hit(pattern, resource):
+                    on_resource.update(gids)
+        candidates &= on_resource
+
+    grants = index["grants"]
+    candidates.update(gid for gid in index["inverted"] if _grant_matches(grants[gid], action, resource))
+
+    matches = {}
+    for gid in sorted(candidates):
+        g = grants[gid]
+        matches.setdefault(g["principal"], []).append(
+            (g["policy"], g["effect"], g["conditional"], _resource_scope(g, resource)))
+    return matches
+
+
+def print_who_can(index, action, resource):
+    started = time.perf_counter()
+    matches = who_can(index, action, resource)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    target = f"{action} on {resource}" if resource else action
+    print(f"\nWHO CAN {target}")
+    print("-" * 70)
+    allowed = []
+    denied = []
+    for principal in sorted(matches):
+        grants = matches[principal]
+        denies = [(conditional, scope) for _, effect, conditional, scope in grants if effect == "Deny"]
+        # only a Deny covering the whole queried resource overrides the Allows
+        if any(not conditional and scope is None for conditional, scope in denies):
+            denied.append(principal)
+            continue
+        allows = [(policy, conditional, scope) for policy, effect, conditional, scope in grants if effect == "Allow"]
+        if allows:
+            except_on = sorted({scope for conditional, scope in denies if not conditional})
+            conditional_deny = any(conditional for conditional, _ in denies)
+            allowed.append((principal, allows, except_on, conditional_deny))
+
+    if not allowed:
+        print("No principal is granted this permission by its identity policies.")
+    else:
+        print(f"{'Principal':<35} {'Via policy':<35} {'Note'}")
+        for principal, allows, except_on, conditional_deny in allowed:
+            for policy, conditional, scope in allows:
+                notes = []
+                if scope:
+                    notes.append(f"partial: {scope}")
+                if conditional:
+                    notes.append("conditional")
+                if except_on:
+                    notes.append(f"except on {'; '.join(except_on)}")
+                if conditional_deny:
+                    notes.append("conditional deny")
+                print(f"{principal:<35} {policy:<35} {', '.join(notes)}")
+    if denied:
+        print(f"Explicitly denied: {', '.join(denied)}")
+
+    built = datetime.fromtimestamp(index["built"]).strftime("%Y-%m-%d %H:%M")
+    print(f"Answered offline in {elapsed_ms:.1f} ms from {len(index['grants'])} statements "
+          f"in {index['policies']} policies (index built {built}).")
+    print("Identity policies only: resource policies, permission boundaries and SCPs are not evaluated.")
+
+
+# -------------------------
+# SERVICE LAST ACCESSED (UNUSED ACCESS)
+# -------------------------
+def submit_last_accessed_job(iam, arn):
+    iam_limiter.acquire()
+    try:
+        return iam.generate_service_last_accessed_details(Arn=arn)["JobId"]
+    except ClientError as e:
+        print(f"NOTE: Cannot analyze {arn} ({e.response['Error']['Code']}).")
+        return None
+
+
+def poll_last_accessed_job(iam, job_id):
+    """Returns (status, services); services are only filled once the job is COMPLETED."""
+    services = []
+    kwargs = {"JobId": job_id}
+    try:
+        while True:
+            iam_limiter.acquire()
+            resp = iam.get_service_last_accessed_details(**kwargs)
+            if resp["JobStatus"] != "COMPLETED":
+                return resp["JobStatus"], []
+            services.extend(resp.get("ServicesLastAccessed", []))
+            if not resp.get("IsTruncated"):
+                return "COMPLETED", services
+            kwargs["Marker"] = resp["Marker"]
+    except ClientError:
+        return "FAILED", []
+
+
+def collect_last_accessed(iam, arns):
+    """Returns {arn: ServicesLastAccessed list} for every principal analyzed.
+
+    All jobs are submitted first, then one loop polls every pending job per
+    round. IAM runs the jobs concurrently, so the wall time is close to the
+    slowest single job rather than the sum of all of them.
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=IAM_DETAIL_WORKERS) as pool:
+        job_ids = pool.map(lambda arn: submit_last_accessed_job(iam, arn), arns)
+        pending = {job_id: arn for arn, job_id in zip(arns, job_ids) if job_id}
+        deadline = time.monotonic() + LAST_ACCESSED_TIMEOUT
+        while pending:
+            time.sleep(LAST_ACCESSED_POLL)
+            jobs = list(pending)
+            for job_id, (status, services) in zip(jobs, pool.map(lambda j: poll_last_accessed_job(iam, j), jobs)):
+                if status == "COMPLETED":
+                    results[pending.pop(job_id)] = services
+                elif status == "FAILED":
+                    print(f"NOTE: Last-accessed job failed for {pending.pop(job_id)}.")
+            if pending and time.monotonic() > deadline:
+                print(f"NOTE: {len(pending)} last-accessed job(s) not finished in time; skipped.")
+                break
+    return results
+
+
+def _stale_services(services, now, days):
+    return [s["ServiceNamespace"] for s in services
+            if not s.get("LastAuthenticated") or (now - s["LastAuthenticated"]).days >= days]
+
+
+def print_unused_access(iam, days):
+    details = fetch_authorization_details(iam)
+    if details is None:
+        users = list_iam_users(iam)
+        roles = list_iam_roles(iam)
+    else:
+        users = details["UserDetailList"]
+        roles = details["RoleDetailList"]
+    principals = ([("role/" + r["RoleName"], r["Arn"]) for r in sorted(roles, key=lambda r: r["RoleName"])] +
+                  [("user/" + u["UserName"], u["Arn"]) for u in sorted(users, key=lambda u: u["UserName"])])
+
+    started = time.monotonic()
+    print(f"\nAnalyzing service last-accessed data for {len(principals)} principals...")
+    results = collect_last_accessed(iam, [arn for _, arn in principals])
+    now = datetime.now(timezone.utc)
+
+    print(f"\nUNUSED ROLES (no service access in {days} days)")
+    print("-" * 70)
+    print(f"{'Role':<40} {'Last activity':<18} {'Services granted'}")
+    unused = 0
+    for name, arn in principals:
+        services = results.get(arn)
+        if not name.startswith("role/") or services is None:
+            continue
+        used = [s["LastAuthenticated"] for s in services if s.get("LastAuthenticated")]
+        if used and (now - max(used)).days < days:
+            continue
+        unused += 1
+        last = f"{(now - max(used)).days} days ago" if used else "never"
+        print(f"{name[5:]:<40} {last:<18} {len(services)}")
+    if not unused:
+        print("None found.")
+
+    print(f"\nUNUSED PERMISSIONS (services granted but not used in {days} days)")
+    print("-" * 70)
+    print(f"{'Principal':<40} {'Unused':<8} {'Services'}")
+    found = False
+    for name, arn in principals:
+        services = results.get(arn)
+        if not services:
+            continue
+        stale = _stale_services(services, now, days)
+        if stale:
+            found = True
+            shown = ", ".join(stale[:5]) + (f" (+{len(stale) - 5} more)" if len(stale) > 5 else "")
+            print(f"{name:<40} {f'{len(stale)}/{len(services)}':<8} {shown}")
+    if not found:
+        print("None found.")
+
+    print(f"Analyzed {len(results)}/{len(principals)} principals in {time.monotonic() - started:.0f}s. "
+          "IAM tracks service access for the last 400 days; 'never' means not within that window.")
+
+
+# -------------------------
+# CREDENTIAL AUDIT (OPT-IN)
+# -------------------------
+def _days_since(value, now):
+    try:
+        return str((now - datetime.fromisoformat(value)).days)
+    except (TypeError, ValueError):
+        return "-"  # N/A, no_information, not_supported
+
+
+def print_credential_audit(report):
+    print("\nCREDENTIAL AUDIT (from credential report; no key IDs or secrets)")
+    print("-" * 90)
+    if report is None:
+        print("Credential report unavailable.")
+        return
+    print(f"{'User':<20} {'Console':<8} {'MFA':<5} {'Pwd used':<9} "
+          f"{'Key1 age':<9} {'Key1 used':<10} {'Key2 age':<9} {'Key2 used':<10}")
+    now = datetime.now(timezone.utc)
+    for user in sorted(report):
+        row = report[user]
+        keys = []
+        for n in (1, 2):
+            if row[f"access_key_{n}_active"] == "true":
+                keys += [_days_since(row[f"access_key_{n}_last_rotated"], now),
+                         _days_since(row[f"access_key_{n}_last_used_date"], now)]
+            else:
+                keys += ["-", "-"]
+        console = "Yes" if row["password_enabled"] == "true" else "No"
+        mfa = "Yes" if row["mfa_active"] == "true" else "No"
+        print(f"{user:<20} {console:<8} {mfa:<5} {_days_since(row['password_last_used'], now):<9} "
+              f"{keys[0]:<9} {keys[1]:<10} {keys[2]:<9} {keys[3]:<10}")
+    print("Ages and last-used values are in days.")
+
+
 # -------------------------
 # MAIN
 # -------------------------
+def parse_args():
+    p = argparse.ArgumentParser(description="Read-only IAM inspector.")
+    p.add_argument("--credentials", action="store_true",
+                   help="Add a credential audit table (console, MFA, key age, last used)")
+    p.add_argument("--who-can", metavar="ACTION",
+                   help="Query the offline permission index, e.g. s3:DeleteObject")
+    p.add_argument("--resource", metavar="ARN",
+                   help="Restrict --who-can to a resource ARN or ARN pattern, e.g. arn:aws:s3:::my-bucket/*")
+    p.add_argument("--refresh-index", action="store_true",
+                   help="Rebuild the permission index even if the cached copy is fresh")
+    p.add_argument("--last-accessed", action="store_true",
+                   help="Report unused roles and unused service permissions (service last-accessed data)")
+    p.add_argument("--unused-days", type=int, default=UNUSED_AFTER_DAYS,
+                   help=f"Days without access before something counts as unused (default {UNUSED_AFTER_DAYS})")
+    args = p.parse_args()
+    if args.resource and not args.who_can:
+        p.error("--resource requires --who-can")
+    return args
+
+
 def main():
+    args = parse_args()
     print_header()
+
+    if args.who_can:
+        index = load_permission_index(refresh=args.refresh_index)
+        print_who_can(index, args.who_can, args.resource)
+        print("\nIAM inspection complete. No changes were performed.")
+        return
+
+    if args.last_accessed:
+        print_unused_access(create_iam_client(), args.unused_days)
+        print("\nIAM inspection complete. No changes were performed.")
+        return
+
     iam = create_iam_client()
+    inventory = load_inventory(iam)
 
     # USERS
-    users = list_iam_users(iam)
     print("\nIAM USERS")
     print("-" * 70)
     print(f"{'User':<20} {'Console':<10} {'Keys':<5} {'Policies':<8} {'Created'}")
-    for u in users:
+    for u in inventory["users"]:
         name = u["UserName"]
         created = u["CreateDate"].strftime("%Y-%m-%d")
-        console = "Yes" if user_has_console_access(iam, name) else "No"
-        keys = count_access_keys(iam, name)
-        policies = count_user_policies(iam, name)
+        console = "Yes" if u["Console"] else "No"
 
-        print(f"{name:<20} {console:<10} {keys:<5} {policies:<8} {created}")
+        print(f"{name:<20} {console:<10} {u['Keys']:<5} {u['Policies']:<8} {created}")
 
     # ROLES
-    roles = list_iam_roles(iam)
+    roles = inventory["roles"]
     print("\nIAM ROLES")
     print("-" * 70)
     print(f"{'Role':<30} {'Trusted Service(s)':<30} {'Created'}")
@@ -136,7 +813,7 @@ def main():
         print(f"{name:<30} {trusted:<30} {created}")
 
     # POLICIES
-    policies = list_customer_policies(iam)
+    policies = inventory["policies"]
     orphan_policies = [p for p in policies if p["AttachmentCount"] == 0]
 
     print("\nCUSTOMER-MANAGED POLICIES")
@@ -157,6 +834,9 @@ def main():
     else:
         print("None found.")
 
+    if args.credentials:
+        print_credential_audit(inventory["report"])
+
     print("\nIAM inspection complete. No changes were performed.")
 
 
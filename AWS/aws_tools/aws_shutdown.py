@@ -1,14 +1,64 @@
 #!/usr/bin/env python3
 
+import argparse
 import boto3
+import json
+import os
 import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
-from botocore.exceptions import ClientError, NoCredentialsError, PartialCredentialsError
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError, NoCredentialsError, PartialCredentialsError, WaiterError
 
 # =========================
 # CONFIGURATION
 # =========================
 DEFAULT_PROFILE = "phase1"
+MAX_SWEEP_WORKERS = 16  # concurrent (region, service) discovery calls
+MAX_DELETE_WORKERS = 16  # concurrent cleanup tasks once a plan is approved
+RETRY_PLAN_FILE = "aws_shutdown_retry_plan.json"
+S3_PURGE_WORKERS = 8     # concurrent delete_objects calls per bucket
+S3_DELETE_BATCH = 1000   # delete_objects accepts at most 1000 keys per call
+# Every bucket in a region shares one purge client: up to MAX_DELETE_WORKERS buckets,
+# each with S3_PURGE_WORKERS delete threads plus its listing thread
+S3_PURGE_CONNECTIONS = MAX_DELETE_WORKERS * (S3_PURGE_WORKERS + 1)
+VERIFY_WORKERS = 16      # concurrent verification checks and waiters
+VERIFY_WAITER_CONFIG = {'Delay': 5, 'MaxAttempts': 12}  # ~1 minute per waiter
+ID_FILTER_LIMIT = 200    # max values per EC2 describe_* filter
+
+# Sweep backends: 'services' lists every service (complete); 'tags' uses one
+# Resource Groups Tagging API pass per region and only sees tagged resources.
+SWEEP_BACKENDS = ('services', 'tags')
+TAG_RESOURCE_TYPES = {
+    'ec2': 'ec2:instance',
+    'ebs': 'ec2:volume',
+    'eip': 'ec2:elastic-ip',
+    'lambda': 'lambda:function',
+    'ddb': 'dynamodb:table',
+    'logs': 'logs:log-group',
+}
+# Types that are usually created untagged (detached root volumes, log groups
+# auto-created by Lambda/ECS) are still listed per service in 'tags' mode
+TAG_API_FALLBACK = ('ebs', 'logs')
+
+# Cost-at-risk estimate (offline price table shipped next to this script)
+PRICE_TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "aws_price_table.json")
+TOP_COST_ROWS = 25
+
+# Regions last seen empty are only probed (not fully swept) until this expires
+SWEEP_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".aws_shutdown_sweep_cache.json")
+EMPTY_REGION_TTL_SECONDS = 24 * 60 * 60
+
+# Delete/stop calls per second, per (service, region); kept under AWS throttling limits
+SERVICE_RATE_LIMITS = {
+    'ec2': 5,
+    'lambda': 5,
+    'dynamodb': 2,
+    'logs': 4,
+    's3': 5,
+}
 
 def create_session(profile: str):
     try:
@@ -60,48 +110,267 @@ def manual_confirm(prompt_text: str, code: str) -> bool:
 # PHASE A: THE SWEEP
 # =========================
 
-def global_sweep(session, regions):
+_client_lock = threading.Lock()
+_clients = {}
+
+def regional_client(session, service, region, max_connections=None):
+    """Returns a cached client; creation is locked because boto3 sessions are not thread-safe.
+
+    max_connections sizes the connection pool (botocore defaults to 10) for
+    clients shared by more threads than that.
+    """
+    key = (service, region, max_connections)
+    with _client_lock:
+        if key not in _clients:
+            config = Config(max_pool_connections=max_connections) if max_connections else None
+            _clients[key] = session.client(service, region_name=region, config=config)
+        return _clients[key]
+
+def _paginate(client, operation, result_key, **kwargs):
+    """Streams items from every page so large regions never sit in memory as raw responses."""
+    for page in client.get_paginator(operation).paginate(**kwargs):
+        yield from page.get(result_key, [])
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _sweep_ec2(session, region):
+    ec2 = regional_client(session, 'ec2', region)
+    return [i['InstanceId'] for r in _paginate(ec2, 'describe_instances', 'Reservations')
+            for i in r.get('Instances', []) if i['State']['Name'] != 'terminated'
+            and not is_protected(i.get('Tags', []))]
+
+def _sweep_ebs(session, region):
+    ec2 = regional_client(session, 'ec2', region)
+    return [v['VolumeId'] for v in _paginate(ec2, 'describe_volumes', 'Volumes',
+            Filters=[{'Name': 'status', 'Values': ['available']}])]
+
+def _sweep_eip(session, region):
+    # describe_addresses has no paginator; it always returns every address
+    # Idle = no association at all: an EIP on a NAT gateway or bare ENI has no InstanceId but is in use
+    eips = regional_client(session, 'ec2', region).describe_addresses()
+    return [a['AllocationId'] for a in eips.get('Addresses', []) if 'AssociationId' not in a]
+
+def _sweep_lambda(session, region):
+    lam = regional_client(session, 'lambda', region)
+    return [f['FunctionName'] for f in _paginate(lam, 'list_functions', 'Functions')]
+
+def _sweep_ddb(session, region):
+    return list(_paginate(regional_client(session, 'dynamodb', region), 'list_tables', 'TableNames'))
+
+def _sweep_logs(session, region):
+    logs = regional_client(session, 'logs', region)
+    return [g['logGroupName'] for g in _paginate(logs, 'describe_log_groups', 'logGroups')]
+
+# One (region, service) unit per entry; keys match the inventory layout
+SWEEP_UNITS = (
+    ('ec2', _sweep_ec2),
+    ('ebs', _sweep_ebs),
+    ('eip', _sweep_eip),
+    ('lambda', _sweep_lambda),
+    ('ddb', _sweep_ddb),
+    ('logs', _sweep_logs),
+)
+
+def _arn_to_entry(arn):
+    """Maps a tagging-API ARN to (inventory key, resource id), or (None, None)."""
+    parts = arn.split(':', 5)
+    service, resource = parts[2], parts[5]
+    if service == 'ec2':
+        rtype, _, rid = resource.partition('/')
+        return {'instance': 'ec2', 'volume': 'ebs', 'elastic-ip': 'eip'}.get(rtype), rid
+    if service == 'lambda':
+        return 'lambda', resource.split(':')[1]
+    if service == 'dynamodb':
+        return 'ddb', resource.partition('/')[2]
+    if service == 'logs':
+        name = resource.partition(':')[2]
+        return 'logs', name[:-2] if name.endswith(':*') else name
+    return None, None
+
+def _sweep_tagged(session, region, services):
+    """One paginated GetResources pass for every tagged resource of the given types.
+
+    The tagging API returns tags but no state, so instances, volumes and EIPs are
+    confirmed with batched ID-filtered describe calls (never one call per resource).
+    """
+    tagging = regional_client(session, 'resourcegroupstaggingapi', region)
+    found = {svc: [] for svc in services}
+    tags = {}
+    for mapping in _paginate(tagging, 'get_resources', 'ResourceTagMappingList',
+                             ResourceTypeFilters=[TAG_RESOURCE_TYPES[svc] for svc in services]):
+        svc, rid = _arn_to_entry(mapping['ResourceARN'])
+        if svc in found:
+            found[svc].append(rid)
+            tags[rid] = mapping.get('Tags', [])
+
+    ec2 = regional_client(session, 'ec2', region)
+    if found.get('ec2'):
+        live = set()
+        for chunk in _chunks(found['ec2'], ID_FILTER_LIMIT):
+            for r in _paginate(ec2, 'describe_instances', 'Reservations',
+                               Filters=[{'Name': 'instance-id', 'Values': chunk}]):
+                live.update(i['InstanceId'] for i in r['Instances'] if i['State']['Name'] != 'terminated')
+        # KeepUntil is checked against the tags GetResources already returned
+        found['ec2'] = [i for i in found['ec2'] if i in live and not is_protected(tags[i])]
+    if found.get('ebs'):
+        available = set()
+        for chunk in _chunks(found['ebs'], ID_FILTER_LIMIT):
+            available.update(v['VolumeId'] for v in _paginate(ec2, 'describe_volumes', 'Volumes', Filters=[
+                {'Name': 'volume-id', 'Values': chunk}, {'Name': 'status', 'Values': ['available']}]))
+        found['ebs'] = [v for v in found['ebs'] if v in available]
+    if found.get('eip'):
+        idle = set()
+        for chunk in _chunks(found['eip'], ID_FILTER_LIMIT):
+            resp = ec2.describe_addresses(Filters=[{'Name': 'allocation-id', 'Values': chunk}])
+            idle.update(a['AllocationId'] for a in resp.get('Addresses', []) if 'AssociationId' not in a)
+        found['eip'] = [a for a in found['eip'] if a in idle]
+    return found
+
+def sweep_units(backend):
+    """Returns (label, services, fn) units; fn(session, region) -> {service: items}."""
+    per_service = [(svc, (svc,), lambda s, r, svc=svc, fn=fn: {svc: fn(s, r)}) for svc, fn in SWEEP_UNITS]
+    if backend != 'tags':
+        return per_service
+    tagged = tuple(svc for svc, _ in SWEEP_UNITS if svc not in TAG_API_FALLBACK)
+    return [('tags', tagged, lambda s, r: _sweep_tagged(s, r, tagged))] + \
+           [unit for unit in per_service if unit[0] in TAG_API_FALLBACK]
+
+def _timed_unit(fn, session, region):
+    started = time.monotonic()
+    items = fn(session, region)
+    return items, started, time.monotonic()
+
+def global_sweep(session, regions, backend='services', stats=None):
     inventory = {}
-    print("Performing Global Discovery Sweep (Fast & Quiet)...")
+    print(f"Performing Global Discovery Sweep (Fast & Quiet, backend: {backend})...")
+    if backend == 'tags':
+        hidden = [svc for svc, _ in SWEEP_UNITS if svc not in TAG_API_FALLBACK]
+        print(f"  [NOTE] Never-tagged resources are not visible for: {', '.join(hidden)}")
     
     # S3 is Global
     s3_client = session.client('s3')
     inventory['global'] = {'s3': [b['Name'] for b in s3_client.list_buckets().get('Buckets', [])]}
 
-    for region in regions:
-        region_data = {}
-        
-        # EC2 & Orphans
-        ec2 = session.client('ec2', region_name=region)
-        instances = ec2.describe_instances()
-        region_data['ec2'] = [i['InstanceId'] for r in instances.get('Reservations', []) 
-                              for i in r.get('Instances', []) if i['State']['Name'] != 'terminated' 
-                              and not is_protected(i.get('Tags', []))]
-        
-        volumes = ec2.describe_volumes(Filters=[{'Name': 'status', 'Values': ['available']}])
-        region_data['ebs'] = [v['VolumeId'] for v in volumes.get('Volumes', [])]
-        
-        eips = ec2.describe_addresses()
-        region_data['eip'] = [a['AllocationId'] for a in eips.get('Addresses', []) if 'InstanceId' not in a]
-
-        # Lambda
-        lam = session.client('lambda', region_name=region)
-        region_data['lambda'] = [f['FunctionName'] for f in lam.list_functions().get('Functions', [])]
-        
-        # DynamoDB
-        ddb = session.client('dynamodb', region_name=region)
-        region_data['ddb'] = ddb.list_tables().get('TableNames', [])
-        
-        # CloudWatch Logs
-        logs = session.client('logs', region_name=region)
-        region_data['logs'] = [g['logGroupName'] for g in logs.describe_log_groups().get('logGroups', [])]
+    results = {region: {} for region in regions}
+    spans = {}      # region -> [first unit start, last unit end]
+    failures = []   # (region, unit label, error)
+
+    with ThreadPoolExecutor(max_workers=MAX_SWEEP_WORKERS) as pool:
+        futures = {
+            pool.submit(_timed_unit, fn, session, region): (region, label, services)
+            for region in regions for label, services, fn in sweep_units(backend)
+        }
+        for fut in as_completed(futures):
+            region, label, services = futures[fut]
+            try:
+                found, started, finished = fut.result()
+            except Exception as e:
+                # A failed unit must not abort the sweep; it is reported below instead
+                failures.append((region, label, str(e)))
+                results[region].update({svc: [] for svc in services})
+                continue
+            results[region].update(found)
+            span = spans.setdefault(region, [started, finished])
+            span[0], span[1] = min(span[0], started), max(span[1], finished)
 
+    counts = {svc: 0 for svc, _ in SWEEP_UNITS}
+    for region in regions:
+        region_data = {svc: results[region][svc] for svc, _ in SWEEP_UNITS}
+        for svc, items in region_data.items():
+            counts[svc] += len(items)
         # Only add region to inventory if it has resources
         if any(region_data.values()):
             inventory[region] = region_data
-            
+
+    print_sweep_report(spans, failures, counts)
+    if stats is not None:
+        stats.update(spans=spans, failures=failures, counts=counts)
     return inventory
 
+# -------------------------
+# SWEEP CACHE (EMPTY REGIONS)
+# -------------------------
+
+def load_sweep_cache(path=SWEEP_CACHE_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_sweep_cache(cache, path=SWEEP_CACHE_FILE):
+    try:
+        with open(path, "w") as f:
+            json.dump(cache, f, indent=2)
+    except OSError as e:
+        print(f"  [WARN] Could not write sweep cache {path}: {e}")
+
+def probe_region(session, region):
+    """One cheap look at a region: any tagged sweepable resource, or any live instance."""
+    tagging = regional_client(session, 'resourcegroupstaggingapi', region)
+    resp = tagging.get_resources(ResourcesPerPage=1, ResourceTypeFilters=list(TAG_RESOURCE_TYPES.values()))
+    if resp.get('ResourceTagMappingList'):
+        return True
+    ec2 = regional_client(session, 'ec2', region)
+    resp = ec2.describe_instances(MaxResults=5, Filters=[{
+        'Name': 'instance-state-name',
+        'Values': ['pending', 'running', 'stopping', 'stopped', 'shutting-down'],
+    }])
+    return bool(resp.get('Reservations'))
+
+def select_regions_to_sweep(session, regions, profile):
+    """Drops regions that were empty on a recent full sweep and still probe clean.
+
+    Returns (regions to sweep, regions skipped after only a probe).
+    """
+    cache = load_sweep_cache().get(profile, {})
+    now = time.time()
+    recent_empty = [r for r in regions
+                    if now - cache.get(r, {}).get('empty_at', 0) < EMPTY_REGION_TTL_SECONDS]
+    if not recent_empty:
+        return regions, []
+
+    dirty = set()
+    with ThreadPoolExecutor(max_workers=MAX_SWEEP_WORKERS) as pool:
+        futures = {pool.submit(probe_region, session, r): r for r in recent_empty}
+        for fut in as_completed(futures):
+            try:
+                if fut.result():
+                    dirty.add(futures[fut])
+            except Exception:
+                dirty.add(futures[fut])  # cannot prove it is empty, so sweep it
+
+    skipped = [r for r in recent_empty if r not in dirty]
+    print(f"  Region cache: {len(skipped)} region(s) skipped (empty on last sweep, probe clean), "
+          f"{len(dirty)} probed non-empty. Use --full-refresh to sweep everything.")
+    return [r for r in regions if r not in skipped], skipped
+
+def record_sweep(regions, inventory, stats, profile):
+    """Marks swept regions that came back empty; regions with failed units are never marked."""
+    cache = load_sweep_cache()
+    entries = cache.setdefault(profile, {})
+    failed = {region for region, _, _ in stats.get('failures', [])}
+    now = time.time()
+    for region in regions:
+        if region in inventory or region in failed:
+            entries.pop(region, None)
+        else:
+            entries[region] = {'empty_at': now}
+    save_sweep_cache(cache)
+
+def print_sweep_report(spans, failures, counts):
+    print("  Found: " + ", ".join(f"{svc}={n}" for svc, n in counts.items()))
+    timings = sorted(((end - start, region) for region, (start, end) in spans.items()), reverse=True)
+    if timings:
+        slowest = ", ".join(f"{region} {secs:.1f}s" for secs, region in timings[:5])
+        print(f"  Swept {len(timings)} regions | slowest: {slowest}")
+    if failures:
+        print(f"  [WARN] {len(failures)} sweep unit(s) failed; their results are missing:")
+        for region, svc, err in sorted(failures):
+            print(f"    - {region:<15} {svc:<8} {err}")
+
 def print_summary(inventory):
     print("\n" + "="*80)
     print(f"{'REGION':<15} | {'SERVICE':<12} | {'COUNT':<5} | {'RESOURCES'}")
@@ -112,76 +381,583 @@ def print_summary(inventory):
                 print(f"{loc:<15} | {svc:<12} | {len(items):<5} | {items}")
     print("="*80 + "\n")
 
+# -------------------------
+# COST AT RISK (ESTIMATE)
+# -------------------------
+
+def load_price_table(path=PRICE_TABLE_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[WARN] Cost estimate skipped; could not load {path}: {e}")
+        return None
+
+def volume_monthly_cost(prices, vol):
+    vtype = vol.get('VolumeType', 'gp2')
+    gb_prices = prices['ebs_gb_month']
+    cost = vol['Size'] * gb_prices.get(vtype, gb_prices['gp2'])
+    iops_price = prices['ebs_iops_month'].get(vtype)
+    if iops_price and vol.get('Iops'):
+        free = prices['gp3_free_iops'] if vtype == 'gp3' else 0
+        cost += max(vol['Iops'] - free, 0) * iops_price
+    if vtype == 'gp3' and vol.get('Throughput'):
+        extra = max(vol['Throughput'] - prices['gp3_free_throughput_mbps'], 0)
+        cost += extra * prices['gp3_throughput_mbps_month']
+    return cost
+
+def _region_costs(session, region, data, prices):
+    """Prices one region's inventory with batched, ID-filtered describe calls."""
+    ec2 = regional_client(session, 'ec2', region)
+    rows = []  # (usd_per_month, region, service, resource, detail)
+
+    owners = {}
+    for chunk in _chunks(data['ec2'], ID_FILTER_LIMIT):
+        for r in _paginate(ec2, 'describe_instances', 'Reservations',
+                           Filters=[{'Name': 'instance-id', 'Values': chunk}]):
+            for inst in r['Instances']:
+                for bdm in inst.get('BlockDeviceMappings', []):
+                    if 'Ebs' in bdm:
+                        owners[bdm['Ebs']['VolumeId']] = inst['InstanceId']
+    volume_ids = list(owners) + data['ebs']
+    per_instance = {}
+    for chunk in _chunks(volume_ids, ID_FILTER_LIMIT):
+        for vol in _paginate(ec2, 'describe_volumes', 'Volumes',
+                             Filters=[{'Name': 'volume-id', 'Values': chunk}]):
+            cost = volume_monthly_cost(prices, vol)
+            owner = owners.get(vol['VolumeId'])
+            if owner:
+                total, size = per_instance.get(owner, (0.0, 0))
+                per_instance[owner] = (total + cost, size + vol['Size'])
+            else:
+                rows.append((cost, region, 'ebs', vol['VolumeId'], f"{vol['Size']} GiB {vol.get('VolumeType', '?')}"))
+    for instance_id, (cost, size) in per_instance.items():
+        rows.append((cost, region, 'ec2', instance_id, f"EBS only ({size} GiB); compute not priced"))
+
+    eip_monthly = prices['eip_idle_hour'] * prices['hours_per_month']
+    rows.extend((eip_monthly, region, 'eip', a, "idle Elastic IP") for a in data['eip'])
+
+    if data['logs']:
+        wanted = set(data['logs'])
+        logs = regional_client(session, 'logs', region)
+        for g in _paginate(logs, 'describe_log_groups', 'logGroups'):
+            if g['logGroupName'] in wanted and g.get('storedBytes'):
+                gb = g['storedBytes'] / 1024 ** 3
+                rows.append((gb * prices['logs_gb_month'], region, 'logs', g['logGroupName'], f"{gb:.2f} GiB stored"))
+    return rows
+
+def print_cost_at_risk(session, inventory):
+    prices = load_price_table()
+    if prices is None:
+        return
+    rows = []
+    with ThreadPoolExecutor(max_workers=MAX_SWEEP_WORKERS) as pool:
+        futures = {pool.submit(_region_costs, session, region, data, prices): region
+                   for region, data in inventory.items() if region != 'global'}
+        for fut in as_completed(futures):
+            try:
+                rows.extend(fut.result())
+            except Exception as e:
+                print(f"  [WARN] Cost estimate failed for {futures[fut]}: {e}")
+    rows.sort(key=lambda r: -r[0])
+
+    print("="*80)
+    print(f"{'$/MONTH':>9} | {'REGION':<15} | {'SERVICE':<7} | {'RESOURCE':<24} | {'DETAIL'}")
+    print("-"*80)
+    for cost, region, svc, resource, detail in rows[:TOP_COST_ROWS]:
+        print(f"{cost:>9.2f} | {region:<15} | {svc:<7} | {resource:<24} | {detail}")
+    print("-"*80)
+    print(f"Estimated cost at risk: ${sum(r[0] for r in rows):,.2f}/month "
+          f"(offline list prices; Lambda, DynamoDB and S3 not priced)")
+    print("="*80 + "\n")
+
 # =========================
 # PHASE B: APPROVALS
 # =========================
 
+def make_task(region, kind, target, deps=()):
+    task_id = f"{region}:{kind}" if isinstance(target, list) else f"{region}:{kind}:{target}"
+    return {'id': task_id, 'region': region, 'kind': kind, 'target': target, 'deps': list(deps)}
+
 def process_cleanup(session, inventory):
+    """Collects every approved batch into one task plan, then runs it."""
+    tasks = []
+
     # S3 Approval
     buckets = inventory.get('global', {}).get('s3', [])
     if buckets:
         print("[ ACTION REQUIRED: GLOBAL S3 ]")
         for b in buckets:
             if manual_confirm(f"Empty and Delete S3 Bucket '{b}'?", "DELETE-BUCKET"):
-                s3_res = session.resource('s3')
-                bucket = s3_res.Bucket(b)
-                bucket.object_versions.delete()
-                bucket.delete()
-                print(f"  [OK] {b} removed.")
+                tasks.append(make_task('global', 'delete_bucket', b))
+                print(f"  [QUEUED] {b}")
 
     # Regional Approvals
     for region in [r for r in inventory if r != 'global']:
         print(f"\n[ ACTION REQUIRED: {region} ]")
         data = inventory[region]
+        stop_deps = []
 
         # 1. Compute
         if data['ec2'] or data['lambda']:
             if manual_confirm(f"Stop EC2s {data['ec2']} and Delete Lambdas {data['lambda']}?", "SHUTDOWN-BATCH"):
-                if data['ec2']: session.client('ec2', region_name=region).stop_instances(InstanceIds=data['ec2'])
-                if data['lambda']: 
-                    l_client = session.client('lambda', region_name=region)
-                    for f in data['lambda']: l_client.delete_function(FunctionName=f)
-                print("  [OK] Compute cleaned.")
+                if data['ec2']:
+                    stop = make_task(region, 'stop_instances', data['ec2'])
+                    tasks.append(stop)
+                    stop_deps = [stop['id']]
+                tasks.extend(make_task(region, 'delete_function', f) for f in data['lambda'])
+                print("  [QUEUED] Compute batch.")
 
-        # 2. Orphans
+        # 2. Orphans (run only after this region's instances have fully stopped)
         if data['ebs'] or data['eip']:
             if manual_confirm(f"Delete Volumes {data['ebs']} and Release IPs {data['eip']}?", "PURGE-ORPHANS"):
-                ec2 = session.client('ec2', region_name=region)
-                for v in data['ebs']: ec2.delete_volume(VolumeId=v)
-                for i in data['eip']: ec2.release_address(AllocationId=i)
-                print("  [OK] Orphans purged.")
+                tasks.extend(make_task(region, 'delete_volume', v, stop_deps) for v in data['ebs'])
+                tasks.extend(make_task(region, 'release_address', i, stop_deps) for i in data['eip'])
+                print("  [QUEUED] Orphan batch.")
 
         # 3. Database & Logs
         if data['ddb'] or data['logs']:
             if manual_confirm(f"Delete Tables {data['ddb']} and Logs {data['logs']}?", "PURGE-DATA"):
-                if data['ddb']:
-                    db = session.client('dynamodb', region_name=region)
-                    for t in data['ddb']: db.delete_table(TableName=t)
-                if data['logs']:
-                    lg = session.client('logs', region_name=region)
-                    for g in data['logs']: lg.delete_log_group(logGroupName=g)
-                print("  [OK] Data purged.")
+                tasks.extend(make_task(region, 'delete_table', t) for t in data['ddb'])
+                tasks.extend(make_task(region, 'delete_log_group', g) for g in data['logs'])
+                print("  [QUEUED] Data batch.")
+
+    if not tasks:
+        print("\nNo cleanup batches were authorized.")
+        return {'tasks': [], 'done': [], 'failed': {}, 'partial': {}}
+    return run_cleanup_plan(session, tasks)
+
+# =========================
+# PHASE B: EXECUTION
+# =========================
+
+class RateLimiter:
+    """Token bucket shared by every worker calling one (service, region) endpoint."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+_limiters = {}
+
+def rate_limiter(service, region):
+    with _client_lock:
+        key = (service, region)
+        if key not in _limiters:
+            _limiters[key] = RateLimiter(SERVICE_RATE_LIMITS[service])
+        return _limiters[key]
+
+class PartialTaskFailure(Exception):
+    """A batch task that finished for some targets; `remaining` lists the rest."""
+
+    def __init__(self, remaining, message):
+        super().__init__(message)
+        self.remaining = remaining
+
+def _stop_instances(session, region, instance_ids):
+    ec2 = regional_client(session, 'ec2', region)
+    ec2.stop_instances(InstanceIds=instance_ids)
+    try:
+        ec2.get_waiter('instance_stopped').wait(InstanceIds=instance_ids)
+    except WaiterError as e:
+        # Only the instances still not stopped are failures; the rest of the region proceeds
+        stuck = sorted(_remaining_instances(session, region, instance_ids))
+        if stuck:
+            raise PartialTaskFailure(stuck, f"not stopped in time: {', '.join(stuck)} ({e})")
+
+def bucket_region(session, name):
+    loc = regional_client(session, 's3', 'us-east-1').get_bucket_location(Bucket=name).get('LocationConstraint')
+    if loc == 'EU':  # legacy constraint value
+        return 'eu-west-1'
+    return loc or 'us-east-1'
+
+def purge_bucket(session, region, name):
+    """Deletes every object version and delete marker, then the bucket.
+
+    Listing runs on this thread and feeds 1000-key delete_objects batches to a
+    small worker pool; the in-flight semaphore keeps listing from racing ahead
+    of deletion, so memory stays bounded on very large buckets.
+    """
+    s3 = regional_client(session, 's3', bucket_region(session, name), max_connections=S3_PURGE_CONNECTIONS)
+    stats = {'deleted': 0, 'bytes': 0, 'errors': []}
+    stats_lock = threading.Lock()
+    in_flight = threading.BoundedSemaphore(S3_PURGE_WORKERS * 2)
+    started = time.monotonic()
+
+    def delete_batch(sizes):
+        try:
+            resp = s3.delete_objects(Bucket=name, Delete={
+                'Objects': [{'Key': k, 'VersionId': v} for k, v in sizes],
+                'Quiet': True,
+            })
+            errors = {(e['Key'], e.get('VersionId')): e.get('Message', e.get('Code'))
+                      for e in resp.get('Errors', [])}
+        except (ClientError, BotoCoreError) as e:
+            # e.g. a read timeout: count every key of the batch as not deleted
+            errors = {kv: str(e) for kv in sizes}
+        with stats_lock:
+            stats['errors'].extend((k, msg) for (k, _), msg in errors.items())
+            for kv, size in sizes.items():
+                if kv not in errors:
+                    stats['deleted'] += 1
+                    stats['bytes'] += size
+
+    batches = []
+
+    def submit(pool, sizes):
+        in_flight.acquire()
+        batches.append(pool.submit(delete_batch, sizes))
+        batches[-1].add_done_callback(lambda _: in_flight.release())
+
+    with ThreadPoolExecutor(max_workers=S3_PURGE_WORKERS) as pool:
+        sizes = {}  # (key, version) -> bytes for the batch being filled
+        for page in s3.get_paginator('list_object_versions').paginate(Bucket=name):
+            for v in page.get('Versions', []) + page.get('DeleteMarkers', []):
+                sizes[(v['Key'], v['VersionId'])] = v.get('Size', 0)
+                if len(sizes) == S3_DELETE_BATCH:
+                    submit(pool, sizes)
+                    sizes = {}
+        if sizes:
+            submit(pool, sizes)
+    for batch in batches:
+        batch.result()  # anything delete_batch did not handle fails the task here, not silently
+
+    elapsed = max(time.monotonic() - started, 1e-6)
+    print(f"  [S3] {name}: {stats['deleted']} objects, {stats['bytes'] / 1024 ** 2:.1f} MiB freed "
+          f"in {elapsed:.1f}s ({stats['deleted'] / elapsed:.0f} obj/s)")
+
+    if stats['errors']:
+        key, msg = stats['errors'][0]
+        raise RuntimeError(f"{len(stats['errors'])} object version(s) not deleted (first: {key}: {msg})")
+    s3.delete_bucket(Bucket=name)
+
+# kind -> (service, handler(session, region, target))
+TASK_HANDLERS = {
+    'stop_instances': ('ec2', _stop_instances),
+    'delete_function': ('lambda', lambda s, r, t: regional_client(s, 'lambda', r).delete_function(FunctionName=t)),
+    'delete_volume': ('ec2', lambda s, r, t: regional_client(s, 'ec2', r).delete_volume(VolumeId=t)),
+    'release_address': ('ec2', lambda s, r, t: regional_client(s, 'ec2', r).release_address(AllocationId=t)),
+    'delete_table': ('dynamodb', lambda s, r, t: regional_client(s, 'dynamodb', r).delete_table(TableName=t)),
+    'delete_log_group': ('logs', lambda s, r, t: regional_client(s, 'logs', r).delete_log_group(logGroupName=t)),
+    'delete_bucket': ('s3', purge_bucket),
+}
+
+def execute_task(session, task):
+    service, handler = TASK_HANDLERS[task['kind']]
+    rate_limiter(service, task['region']).acquire()
+    handler(session, task['region'], task['target'])
+
+def run_cleanup_plan(session, tasks):
+    """Runs tasks concurrently, starting each one only after all of its deps succeeded.
+
+    A failed task fails its dependents too (they are never started). A task that
+    raises PartialTaskFailure counts as done for its dependents; only its
+    remaining targets are retried. Everything that did not complete is written
+    to RETRY_PLAN_FILE for a later --retry-plan run.
+    """
+    print(f"\nExecuting {len(tasks)} cleanup task(s) with up to {MAX_DELETE_WORKERS} workers...")
+    pending = {t['id']: t for t in tasks}
+    done, failed = [], {}
+    partial = {}  # task id -> (remaining targets, error)
+    total = len(tasks)
+
+    with ThreadPoolExecutor(max_workers=MAX_DELETE_WORKERS) as pool:
+        running = {}
+        while pending or running:
+            for task_id, task in list(pending.items()):
+                if any(d in failed for d in task['deps']):
+                    failed[task_id] = "skipped: dependency failed"
+                    del pending[task_id]
+                    print(f"  [{len(done) + len(failed)}/{total}] SKIP {task_id}")
+                elif all(d in done for d in task['deps']):
+                    running[pool.submit(execute_task, session, task)] = task
+                    del pending[task_id]
+            if not running:
+                # Anything left waits on a task that is not in this plan
+                for task_id in pending:
+                    failed[task_id] = "skipped: dependency not in plan"
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                task = running.pop(fut)
+                try:
+                    fut.result()
+                    done.append(task['id'])
+                    print(f"  [{len(done) + len(failed)}/{total}] OK   {task['id']}")
+                except PartialTaskFailure as e:
+                    done.append(task['id'])
+                    partial[task['id']] = (e.remaining, str(e))
+                    print(f"  [{len(done) + len(failed)}/{total}] PART {task['id']} -> {e}")
+                except Exception as e:
+                    failed[task['id']] = str(e)
+                    print(f"  [{len(done) + len(failed)}/{total}] FAIL {task['id']} -> {e}")
+
+    print(f"\nCleanup finished: {len(done) - len(partial)} succeeded, {len(partial)} partially failed, "
+          f"{len(failed)} failed.")
+    if failed or partial:
+        retry = [t for t in tasks if t['id'] in failed]
+        retry += [{**t, 'target': partial[t['id']][0]} for t in tasks if t['id'] in partial]
+        write_retry_plan(retry, {**failed, **{task_id: error for task_id, (_, error) in partial.items()}})
+    return {'tasks': tasks, 'done': done, 'failed': failed, 'partial': partial}
+
+def write_retry_plan(tasks, errors, path=RETRY_PLAN_FILE):
+    retry = []
+    for t in tasks:
+        # Dependencies that already succeeded are satisfied; keep only the ones being retried
+        deps = [d for d in t['deps'] if d in errors]
+        retry.append({**t, 'deps': deps, 'error': errors[t['id']]})
+    with open(path, "w") as f:
+        json.dump({'created': datetime.now().isoformat(timespec='seconds'), 'tasks': retry}, f, indent=2)
+    print(f"[RETRY] {len(retry)} failed task(s) written to {path}")
+    print(f"        Re-run with: python aws_shutdown.py --retry-plan {path}")
+
+def load_retry_plan(path):
+    try:
+        with open(path) as f:
+            return json.load(f)['tasks']
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[ERROR] Could not read retry plan {path}: {e}")
+        sys.exit(1)
+
+# =========================
+# PHASE C: VERIFICATION
+# =========================
+
+def _ec2_present(session, region, operation, result_key, id_key, filter_name, ids):
+    ec2 = regional_client(session, 'ec2', region)
+    present = set()
+    for chunk in _chunks(ids, ID_FILTER_LIMIT):
+        for item in _paginate(ec2, operation, result_key, Filters=[{'Name': filter_name, 'Values': chunk}]):
+            present.add(item[id_key])
+    return present
+
+def _remaining_instances(session, region, ids):
+    ec2 = regional_client(session, 'ec2', region)
+    remaining = set()
+    for chunk in _chunks(ids, ID_FILTER_LIMIT):
+        for r in _paginate(ec2, 'describe_instances', 'Reservations',
+                           Filters=[{'Name': 'instance-id', 'Values': chunk}]):
+            remaining.update(i['InstanceId'] for i in r['Instances']
+                             if i['State']['Name'] not in ('stopped', 'terminated'))
+    return remaining
+
+def _remaining_addresses(session, region, ids):
+    ec2 = regional_client(session, 'ec2', region)
+    remaining = set()
+    for chunk in _chunks(ids, ID_FILTER_LIMIT):
+        resp = ec2.describe_addresses(Filters=[{'Name': 'allocation-id', 'Values': chunk}])
+        remaining.update(a['AllocationId'] for a in resp.get('Addresses', []))
+    return remaining
+
+def _remaining_listed(service, operation, result_key, name_key=None):
+    """For services without ID filters: one paginated listing, intersected with the targets."""
+    def check(session, region, ids):
+        client = regional_client(session, service, None if region == 'global' else region)
+        if operation == 'list_buckets':
+            listed = (b['Name'] for b in client.list_buckets().get('Buckets', []))
+        else:
+            listed = _paginate(client, operation, result_key)
+            if name_key:
+                listed = (item[name_key] for item in listed)
+        return set(ids) & set(listed)
+    return check
+
+# kind -> (remaining-check, optional waiter: (service, waiter name, kwargs builder, batch size))
+VERIFIERS = {
+    'stop_instances': (_remaining_instances,
+                       ('ec2', 'instance_stopped', lambda ids: {'InstanceIds': ids}, ID_FILTER_LIMIT)),
+    'delete_volume': (lambda s, r, ids: _ec2_present(s, r, 'describe_volumes', 'Volumes', 'VolumeId', 'volume-id', ids),
+                      ('ec2', 'volume_deleted', lambda ids: {'VolumeIds': ids}, ID_FILTER_LIMIT)),
+    'release_address': (_remaining_addresses, None),
+    'delete_function': (_remaining_listed('lambda', 'list_functions', 'Functions', 'FunctionName'), None),
+    'delete_table': (_remaining_listed('dynamodb', 'list_tables', 'TableNames'),
+                     ('dynamodb', 'table_not_exists', lambda ids: {'TableName': ids[0]}, 1)),
+    'delete_log_group': (_remaining_listed('logs', 'describe_log_groups', 'logGroups', 'logGroupName'), None),
+    'delete_bucket': (_remaining_listed('s3', 'list_buckets', 'Buckets'),
+                      ('s3', 'bucket_not_exists', lambda ids: {'Bucket': ids[0]}, 1)),
+}
+
+def _run_waiter(session, region, waiter_spec, ids):
+    service, name, build_kwargs, _ = waiter_spec
+    client = regional_client(session, service, None if region == 'global' else region)
+    try:
+        client.get_waiter(name).wait(WaiterConfig=VERIFY_WAITER_CONFIG, **build_kwargs(ids))
+        return set(ids)
+    except WaiterError:
+        return set()
+
+def verify_cleanup(session, result):
+    """Re-checks only the resources that were targeted, instead of a second global sweep.
+
+    Each (region, kind) group gets one batched check; anything still present is
+    given to that service's waiter (all waiters run concurrently) before it is
+    reported as pending.
+    """
+    groups = {}  # (region, kind) -> {target: task id}
+    stuck = {(task_id, target): error  # targets a partially failed task did not finish
+             for task_id, (targets, error) in result['partial'].items() for target in targets}
+    for t in result['tasks']:
+        targets = t['target'] if isinstance(t['target'], list) else [t['target']]
+        for target in targets:
+            groups.setdefault((t['region'], t['kind']), {})[target] = t['id']
+
+    remaining = {}
+    with ThreadPoolExecutor(max_workers=VERIFY_WORKERS) as pool:
+        futures = {
+            pool.submit(VERIFIERS[kind][0], session, region, list(targets)): (region, kind)
+            for (region, kind), targets in groups.items()
+        }
+        for fut in as_completed(futures):
+            key = futures[fut]
+            try:
+                remaining[key] = set(fut.result())
+            except Exception as e:
+                print(f"  [WARN] Could not verify {key[0]} {key[1]}: {e}")
+                remaining[key] = set(groups[key])
+
+        waits = {}
+        for (region, kind), ids in remaining.items():
+            spec = VERIFIERS[kind][1]
+            if not spec or not ids:
+                continue
+            # Failed tasks will not converge; only wait on ones that reported success
+            ids = sorted(i for i in ids if groups[(region, kind)][i] not in result['failed']
+                         and (groups[(region, kind)][i], i) not in stuck)
+            for chunk in _chunks(ids, spec[3]):
+                waits[pool.submit(_run_waiter, session, region, spec, chunk)] = (region, kind)
+        for fut in as_completed(waits):
+            try:
+                remaining[waits[fut]] -= fut.result()
+            except Exception as e:
+                print(f"  [WARN] Waiter failed for {waits[fut][0]} {waits[fut][1]}: {e}")
+
+    rows = []
+    for (region, kind), targets in groups.items():
+        for target, task_id in targets.items():
+            if target not in remaining[(region, kind)]:
+                status = 'done'
+            elif task_id in result['failed'] or (task_id, target) in stuck:
+                status = 'failed'
+            else:
+                status = 'pending'
+            error = result['failed'].get(task_id) or stuck.get((task_id, target), '')
+            rows.append((region, kind, target, status, error))
+    print_verification_report(rows)
+    return rows
+
+def print_verification_report(rows):
+    totals = {}
+    for region, kind, _, status, _ in rows:
+        counts = totals.setdefault((region, kind), {'done': 0, 'pending': 0, 'failed': 0})
+        counts[status] += 1
+
+    print("\n" + "="*80)
+    print(f"{'REGION':<15} | {'ACTION':<18} | {'DONE':<6} | {'PENDING':<7} | {'FAILED':<6}")
+    print("-"*80)
+    for (region, kind), c in sorted(totals.items()):
+        print(f"{region:<15} | {kind:<18} | {c['done']:<6} | {c['pending']:<7} | {c['failed']:<6}")
+    print("="*80)
+
+    open_items = [r for r in rows if r[3] != 'done']
+    for region, kind, target, status, error in sorted(open_items):
+        detail = f" ({error})" if error else ""
+        print(f"  [{status.upper()}] {region} {kind} {target}{detail}")
+    if not open_items:
+        print("All targeted resources verified as stopped or deleted.")
+    print()
 
 # =========================
 # MAIN EXECUTION
 # =========================
 
+def parse_args():
+    p = argparse.ArgumentParser(description="Final account cleanup protocol (supervised).")
+    p.add_argument("--retry-plan", metavar="FILE", help="Re-run the failed tasks recorded in a retry plan file")
+    p.add_argument("--backend", choices=SWEEP_BACKENDS, default="services",
+                   help="Inventory backend: per-service listing (complete) or the Tagging API (tagged resources only)")
+    p.add_argument("--cost", action="store_true",
+                   help="Print an estimated dollars-per-month ranking of the swept resources before approvals")
+    p.add_argument("--full-refresh", action="store_true",
+                   help="Ignore the sweep cache and fully sweep every enabled region")
+    return p.parse_args()
+
+def retry_failed(session, path):
+    tasks = load_retry_plan(path)
+    if not tasks:
+        print("Retry plan is empty. Nothing to do.")
+        return
+    print(f"\n[ RETRY PLAN: {path} ]")
+    for t in tasks:
+        print(f"  - {t['id']:<60} last error: {t.get('error', 'n/a')}")
+    if manual_confirm(f"Re-run {len(tasks)} failed cleanup task(s)?", "RETRY-PLAN"):
+        result = run_cleanup_plan(session, [{k: v for k, v in t.items() if k != 'error'} for t in tasks])
+        print("\nVerifying retried resources...")
+        verify_cleanup(session, result)
+        complete = not result['failed'] and not result['partial']
+        if complete and os.path.abspath(path) != os.path.abspath(RETRY_PLAN_FILE):
+            print(f"All retried tasks succeeded. {path} can be discarded.")
+        elif complete:
+            os.remove(path)
+            print(f"All retried tasks succeeded. Removed {path}.")
+
 def main():
+    args = parse_args()
     session = create_session(DEFAULT_PROFILE)
+
+    if args.retry_plan:
+        retry_failed(session, args.retry_plan)
+        return
+
     regions = get_enabled_regions(session)
+    skipped = []
+    if not args.full_refresh:
+        regions, skipped = select_regions_to_sweep(session, regions, DEFAULT_PROFILE)
+
+    stats = {}
+    inventory = global_sweep(session, regions, backend=args.backend, stats=stats)
+    if args.backend == 'services':
+        # Only a complete per-service sweep can prove a region is empty
+        record_sweep(regions, inventory, stats, DEFAULT_PROFILE)
     
-    inventory = global_sweep(session, regions)
-    
-    if not any(any(v) for v in inventory.values()):
+    if not any(items for data in inventory.values() for items in data.values()):
+        if stats['failures']:
+            # Missing results are not evidence of an empty account
+            pairs = sorted({(region, label) for region, label, _ in stats['failures']})
+            print(f"No resources found, but {len(pairs)} sweep unit(s) failed; the account is NOT confirmed clean:")
+            for region, label in pairs:
+                print(f"  - {region} / {label}")
+            sys.exit(1)
+        if skipped:
+            # The probe cannot see untagged Lambdas, tables, log groups, volumes or EIPs
+            print(f"No resources found in the swept regions. {len(skipped)} region(s) only probed, not swept; "
+                  f"run --full-refresh to confirm the account is clean.")
+            return
         print("No resources found in any enabled region. Account is clean!")
         return
 
     print_summary(inventory)
-    process_cleanup(session, inventory)
-    
-    print("\nPerforming Final Verification Audit...")
-    final_inv = global_sweep(session, regions)
-    print_summary(final_inv)
+    if args.cost:
+        print_cost_at_risk(session, inventory)
+    result = process_cleanup(session, inventory)
+
+    if result['tasks']:
+        print("\nPerforming Final Verification Audit (targeted resources only)...")
+        verify_cleanup(session, result)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file